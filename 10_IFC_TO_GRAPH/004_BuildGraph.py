@@ -1,6 +1,8 @@
+import os
 import ifcopenshell
 import yaml
 import re
+import argparse
 from neo4j import GraphDatabase
 
 from neo4j_functions import (
@@ -13,8 +15,14 @@ from neo4j_functions import (
     process_direct_connections, 
     process_element_connections,
     process_furniture,
-    cleanup_isolated_nodes
+    cleanup_isolated_nodes,
+    ensure_schema,
+    delete_nodes,
+    delete_relationships,
+    rooms_of_elements,
+    BatchWriter
 )
+from incremental import build_manifest, storey_step, load_manifest, save_manifest, diff_manifests, print_changes, read_adjacency_csv
 
 def filter_spaces_by_category(spaces, category_value="Rooms"):
     filtered_spaces = []
@@ -47,7 +55,30 @@ def filter_ifcspaces_by_storey(spaces, storey_name):
                     break
     return filtered_spaces
 
+def element_in_storey(element, storey_name):
+    for rel in element.ContainedInStructure:
+        if rel.is_a("IfcRelContainedInSpatialStructure") and rel.RelatingStructure.is_a("IfcBuildingStorey"):
+            if rel.RelatingStructure.Name == storey_name:
+                return True
+    return False
+
+def storey_elements(ifc_file, spaces, storey_name):
+    # Elements this storey writes to the graph: its rooms, the walls, doors and windows contained in the storey
+    # and the furniture of its rooms. Changes of other storeys are left to their own runs.
+    elements = list(spaces)
+    for ifc_type in ["IfcWall", "IfcDoor", "IfcWindow"]:
+        elements.extend(element for element in ifc_file.by_type(ifc_type) if element_in_storey(element, storey_name))
+    for space in spaces:
+        for rel in space.ContainsElements:
+            elements.extend(element for element in rel.RelatedElements if element.is_a("IfcFurnishingElement"))
+    return elements
+
 def main():
+    parser = argparse.ArgumentParser(description="Write rooms, elements and their connections from the Output CSVs to Neo4j")
+    parser.add_argument("--incremental", action="store_true", help="Only rewrite nodes and relationships of elements of this storey that changed since the last incremental run. "
+                             "Material layers and IsFacing edges of 005A are kept, run 005A again after walls or rooms were moved or removed")
+    args = parser.parse_args()
+
     # Paths
     csv_room_to_room = "Output01_RoomToRoom_BySeparationLine.csv"
     csv_doors = "Output02_RoomToRoom_ByDoors.csv"
@@ -62,8 +93,10 @@ def main():
 
     ifc_file_path = config["ifc_file"]
     storey_name = config["storey_name"]
-    username = config["username"]
-    password = config["password"]
+    # run_corpus.py passes the credentials through the environment instead of the storey config.yaml
+    username = os.environ.get("NEO4J_USERNAME", config.get("username"))
+    password = os.environ.get("NEO4J_PASSWORD", config.get("password"))
+    batch_size = config.get("batch_size", 1000)
 
 
     # Open IFC file
@@ -79,36 +112,87 @@ def main():
     uri = "bolt://localhost:7687"
     driver = GraphDatabase.driver(uri, auth=(username, password))
 
+    # Constraints on the node keys, so every MATCH/MERGE on GlobalId is an index seek
+    ensure_schema(driver)
+
+    # Incremental run: replace only the nodes of changed elements and the rooms around changed openings
+    graph_guids = None
+    if args.incremental:
+        manifest_step = storey_step("004_graph", ifc_file_path, storey_name)
+        manifest = build_manifest(storey_elements(ifc_file, spaces, storey_name))
+        previous_manifest = load_manifest(manifest_step)
+        if previous_manifest is not None:
+            changes = diff_manifests(previous_manifest, manifest)
+            print_changes(changes)
+            graph_guids = changes["added"] | changes["geometry"] | changes["properties"]
+
+            # Access edges between rooms come from doors and windows, so their rooms are rewritten as well
+            openings = {
+                guid for guid in graph_guids | changes["removed"]
+                if (manifest.get(guid) or previous_manifest[guid])["type"] in ["IfcDoor", "IfcWindow"]
+            }
+            graph_guids |= rooms_of_elements(driver, openings)
+            for csv_file in [csv_doors, csv_windows]:
+                for element_guid, room_guids in read_adjacency_csv(csv_file).items():
+                    if element_guid in openings:
+                        graph_guids.update(room_guids)
+
+            # Removed elements are deleted, changed ones keep their node and only lose the relationships 004 writes
+            delete_nodes(driver, changes["removed"])
+            deleted = delete_relationships(driver, graph_guids)
+            print(f"Rewriting {len(graph_guids)} nodes and {deleted} relationships, {len(changes['removed'])} nodes deleted")
+
+            # 005A derives its layers and IsFacing edges from the wall and room geometry, 004 does not rewrite them
+            stale = {
+                guid for guid in changes["geometry"] | changes["removed"]
+                if (manifest.get(guid) or previous_manifest[guid])["type"] in ["IfcSpace", "IfcWall"]
+            }
+            if stale:
+                print(f"!! {len(stale)} walls / rooms were moved or removed, run 005A again to update their Material layers and IsFacing edges !!")
+        else:
+            print("No manifest of an earlier run, writing the whole graph")
+
+    # Rows are buffered per label / relationship type and written in UNWIND batches
+    writer = BatchWriter(driver, batch_size=batch_size, only_guids=graph_guids)
+
     # Create Nodes and write Data
-    create_ifcspace_nodes(driver, spaces, storey_name)
+    create_ifcspace_nodes(driver, spaces, storey_name, writer)
 
     # Add Doors and Window as Nodes and add connections to rooms
-    process_doors_and_windows(driver, ifc_file, csv_doors, "IfcDoor", "Door", storey_name)
-    process_doors_and_windows(driver, ifc_file, csv_windows, "IfcWindow", "Window", storey_name)
+    process_doors_and_windows(driver, ifc_file, csv_doors, "IfcDoor", "Door", storey_name, writer)
+    process_doors_and_windows(driver, ifc_file, csv_windows, "IfcWindow", "Window", storey_name, writer)
 
     # Add Walls
-    process_walls(driver, ifc_file, storey_name)
+    process_walls(driver, ifc_file, storey_name, writer)
+    all_walls = ifc_file.by_type("IfcWall")
 
     # Connect Walls with rooms
-    process_walls_and_rooms(driver, csv_walls, ifc_file.by_type("IfcWall"))
+    process_walls_and_rooms(driver, csv_walls, all_walls, writer)
 
     # Connect Walls to each other
-    process_wall_adjacency(driver, csv_wall_adjacency, ifc_file.by_type("IfcWall"))
+    process_wall_adjacency(driver, csv_wall_adjacency, all_walls, writer)
 
     # Connect Windows and Doors to their Host
-    process_element_hosts(driver, ifc_file, csv_host_elements, ifc_file.by_type("IfcWall"))
+    process_element_hosts(driver, ifc_file, csv_host_elements, all_walls, writer)
 
     # Create Connections between Rooms
-    process_direct_connections(driver, csv_room_to_room)
-    process_element_connections(driver, csv_doors, "Door")
-    process_element_connections(driver, csv_windows, "Window")
+    process_direct_connections(driver, csv_room_to_room, writer)
+    process_element_connections(driver, csv_doors, "Door", writer)
+    process_element_connections(driver, csv_windows, "Window", writer)
 
     # Add Furniture
-    process_furniture(driver, ifc_file, storey_name)
+    process_furniture(driver, ifc_file, storey_name, writer)
+
+    # Write the remaining buffered rows
+    writer.flush()
+    print(f"Graph written with {writer.statements} UNWIND statements")
 
     # Clean up isolated Nodes
     cleanup_isolated_nodes(driver, storey_name)
 
+    if args.incremental:
+        save_manifest(manifest_step, manifest)
+
     # Close Neo4j
     driver.close()
     print("IfcSpaces, Türen, Fenster, Wände und Verbindungen wurden erfolgreich in Neo4j importiert.")
@@ -0,0 +1,448 @@
+import math
+import time
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from topologicpy.Topology import Topology
+from topologicpy.Vertex import Vertex
+from topologicpy.Wire import Wire
+from topologicpy.Face import Face
+from topologicpy.Cell import Cell
+from topologicpy.Cluster import Cluster
+from topologicpy.CellComplex import CellComplex
+from topologicpy.Dictionary import Dictionary
+
+# --- Pairwise face checks ---
+def cells_share_face(cell1, cell2):
+    # Merge the cells into the same CellComplex structure
+    merged = Topology.Merge(topologyA=cell1, topologyB=cell2)
+    
+    # Get the merged cells from the merged topology
+    merged_cells = Topology.Cells(merged)
+    
+    # Check if there are enough merged cells
+    if len(merged_cells) < 2:
+        logging.debug(f"Not enough merged cells found: {len(merged_cells)}")
+        return False
+    
+    # Check if they share any faces
+    shared_faces = Topology.SharedFaces(merged_cells[0], merged_cells[1])
+    return len(shared_faces) > 0
+
+def layer_cells_share_face(cell1, cell2):
+    try:
+        # Attempt to merge the cells
+        merged_cell = Topology.Merge(cell1, cell2)
+        
+        # Get the cells in the merged topology
+        merged_cells = Topology.Cells(merged_cell)
+
+        # Ensure that merged_cells contains at least two cells
+        if len(merged_cells) < 2:
+            print("Merged cells have less than 2 elements.")
+            return False
+
+        shared_faces = Topology.SharedFaces(merged_cells[0], merged_cells[1])
+        return bool(shared_faces)
+        
+    except RuntimeError as e:
+        # Catch and print any RuntimeErrors from the merge operation
+        print(f"Failed to merge topologies: {e}")
+        print(f"Cell1: {cell1}, Cell2: {cell2}")
+        return False
+
+def find_touching_walls(topology1, topology2):
+    cells1 = Topology.Cells(topology1)
+    cells2 = Topology.Cells(topology2)
+
+    for cell1 in cells1:
+        for cell2 in cells2:
+            if layer_cells_share_face(cell1, cell2):
+                return True
+
+    return False
+
+# --- Layer aware contact ---
+# Layers closer than this (meters) count as touching. The walls are in project units,
+# callers convert it with project_unit_scale like the snap grid; the functions below take project units
+DEFAULT_LAYER_TOLERANCE = 0.001
+
+def outer_layers_first(count):
+    # 0, n-1, 1, n-2, ...: the outer layers of a layer set are the ones facing other walls
+    order = []
+    low, high = 0, count - 1
+    while low <= high:
+        order.append(low)
+        if high != low:
+            order.append(high)
+        low += 1
+        high -= 1
+    return order
+
+def layer_bounding_boxes(cells):
+    return [topology_bounding_box(cell) for cell in cells]
+
+def touching_layers(cells1, cells2, boxes1=None, boxes2=None, tolerance=0.0):
+    # Merges only for layer pairs whose boxes touch, outer layer pairs first, stop at the first shared face
+    # Returns (touching, merges run, merges skipped against the full layer x layer loop)
+    if boxes1 is None:
+        boxes1 = layer_bounding_boxes(cells1)
+    if boxes2 is None:
+        boxes2 = layer_bounding_boxes(cells2)
+
+    rank1 = {layer: rank for rank, layer in enumerate(outer_layers_first(len(cells1)))}
+    rank2 = {layer: rank for rank, layer in enumerate(outer_layers_first(len(cells2)))}
+    candidates = [
+        (a, b) for a in range(len(cells1)) for b in range(len(cells2))
+        if boxes_overlap(boxes1[a], boxes2[b], tolerance)
+    ]
+    candidates.sort(key=lambda pair: (rank1[pair[0]] + rank2[pair[1]], rank1[pair[0]]))
+
+    merges = 0
+    for a, b in candidates:
+        merges += 1
+        if layer_cells_share_face(cells1[a], cells2[b]):
+            return True, merges, len(cells1) * len(cells2) - merges
+    return False, merges, len(cells1) * len(cells2) - merges
+
+def find_touching_walls_by_layers(topology1, topology2, tolerance=0.0):
+    # Same check on whole wall topologies (process pool), the layer boxes are taken from the cells here
+    return touching_layers(Topology.Cells(topology1), Topology.Cells(topology2), tolerance=tolerance)
+
+# --- Functions for the bounding box broad phase ---
+def topology_bounding_box(topology):
+    # Axis aligned extents of a topology as (min_x, min_y, min_z, max_x, max_y, max_z)
+    coordinates = np.array([Vertex.Coordinates(vertex) for vertex in Topology.Vertices(topology)])
+    return tuple(coordinates.min(axis=0)) + tuple(coordinates.max(axis=0))
+
+def boxes_overlap(box1, box2, tolerance=0.0):
+    # Boxes that only touch (distance <= tolerance) still count as overlapping
+    for axis in range(3):
+        if box1[axis] - tolerance > box2[axis + 3] or box2[axis] - tolerance > box1[axis + 3]:
+            return False
+    return True
+
+def grid_keys(box, cell_size, tolerance=0.0):
+    # All XY grid cells covered by the (tolerance grown) box
+    min_x = math.floor((box[0] - tolerance) / cell_size)
+    min_y = math.floor((box[1] - tolerance) / cell_size)
+    max_x = math.floor((box[3] + tolerance) / cell_size)
+    max_y = math.floor((box[4] + tolerance) / cell_size)
+    return [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+def default_cell_size(boxes):
+    # Mean XY extent of the boxes, so a box covers only a handful of grid cells
+    extents = [max(box[3] - box[0], box[4] - box[1]) for box in boxes]
+    cell_size = sum(extents) / len(extents) if extents else 1.0
+    return cell_size if cell_size > 0 else 1.0
+
+def build_grid_index(boxes, cell_size, tolerance=0.0):
+    grid = {}
+    for index, box in enumerate(boxes):
+        for key in grid_keys(box, cell_size, tolerance):
+            grid.setdefault(key, []).append(index)
+    return grid
+
+def candidate_pairs(boxes, tolerance=0.0, cell_size=None):
+    # Unordered index pairs (i < j) whose boxes overlap within tolerance
+    if cell_size is None:
+        cell_size = default_cell_size(boxes)
+    grid = build_grid_index(boxes, cell_size, tolerance)
+
+    pairs = set()
+    for members in grid.values():
+        # members are appended in index order, so a < b implies i < j
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                pair = (members[a], members[b])
+                if pair not in pairs and boxes_overlap(boxes[pair[0]], boxes[pair[1]], tolerance):
+                    pairs.add(pair)
+    return sorted(pairs)
+
+# --- One-shot adjacency of a storey ---
+def point_in_box(point, box, tolerance=0.0):
+    return all(box[axis] - tolerance <= point[axis] <= box[axis + 3] + tolerance for axis in range(3))
+
+def owner_of_cell(cell, cells, boxes, members, tolerance=0.0):
+    # Room whose cell contains an internal vertex of the merged cell (boxes first, exact test after)
+    vertex = Topology.InternalVertex(cell)
+    if vertex is None:
+        return None
+    point = Vertex.Coordinates(vertex)
+    for index in members:
+        if point_in_box(point, boxes[index], tolerance) and Vertex.IsInternal(vertex, cells[index]):
+            return index
+    return None
+
+def self_merge_pairs(cells, boxes, members, tolerance=0.0):
+    # One SelfMerge of the member cells, the cells on both sides of every internal face are a touching pair
+    # Returns {(i, j)} with i < j, or None if the merge failed
+    merged = Topology.SelfMerge(Cluster.ByTopologies([cells[index] for index in members]))
+    if merged is None:
+        return None
+
+    # Merged cells get the index of their room, faces find it again through their super topologies
+    for merged_cell in Topology.Cells(merged):
+        owner = owner_of_cell(merged_cell, cells, boxes, members, tolerance)
+        if owner is not None:
+            Topology.SetDictionary(merged_cell, Dictionary.ByKeyValue("room", owner))
+
+    complexes = [merged] if Topology.IsInstance(merged, "CellComplex") else Topology.CellComplexes(merged)
+    pairs = set()
+    for complex in complexes:
+        for face in CellComplex.InternalFaces(complex):
+            owners = set()
+            for cell in Topology.SuperTopologies(face, complex, "cell"):
+                owner = Dictionary.ValueAtKey(Topology.Dictionary(cell), "room")
+                if owner is not None:
+                    owners.add(owner)
+            # Fragments of the same room share faces as well, those are no room pair
+            if len(owners) == 2:
+                pairs.add(tuple(sorted(owners)))
+    return pairs
+
+def self_merge_tile(cells, boxes, members, tolerance=0.0, candidates=None):
+    # SelfMerge of the member cells, pairwise merges of the candidate pairs if it fails
+    # Returns the touching pairs and the number of booleans run
+    touching = self_merge_pairs(cells, boxes, members, tolerance)
+    if touching is not None:
+        return touching, 1
+
+    print(f"Self merge of {len(members)} rooms failed, checking their pairs one by one")
+    if candidates is None:
+        candidates = [
+            (members[a], members[b]) for a in range(len(members)) for b in range(a + 1, len(members))
+            if boxes_overlap(boxes[members[a]], boxes[members[b]], tolerance)
+        ]
+    touching = {pair for pair in candidates if cells_share_face(cells[pair[0]], cells[pair[1]])}
+    return touching, 1 + len(candidates)
+
+def storey_self_merge_pairs(cells, boxes, tolerance=0.0):
+    # All cells of the storey in one SelfMerge (tiled storeys: tiling.py)
+    print(f"Self merge of {len(cells)} rooms")
+    return self_merge_tile(cells, boxes, list(range(len(cells))), tolerance)
+
+# --- Functions for the symmetric adjacency engine ---
+def symmetric_adjacency(keys, topologies, share_face, pairs=None):
+    # Face sharing is symmetric: check every unordered pair once and mirror the result
+    if pairs is None:
+        pairs = [(i, j) for i in range(len(keys)) for j in range(i + 1, len(keys))]
+
+    results = []
+    current = None
+    for i, j in pairs:
+        if i != current:
+            print(f"Check {i+1} / {len(keys)}")
+            current = i
+        results.append(share_face(topologies[i], topologies[j]))
+
+    return mirror_adjacency(keys, pairs, results)
+
+def mirror_adjacency(keys, pairs, results):
+    touching = {index: [] for index in range(len(keys))}
+    for (i, j), hit in zip(pairs, results):
+        if hit:
+            touching[i].append(j)
+            touching[j].append(i)
+
+    # Keep the order of the ordered (i, j) loop: rows by key order, partners by key order
+    adjacency = {}
+    for index in range(len(keys)):
+        if touching[index]:
+            adjacency[keys[index]] = [keys[j] for j in sorted(touching[index])]
+
+    stats = {
+        "pairs_checked": len(pairs),
+        "merges_avoided": len(keys) * (len(keys) - 1) - len(pairs)
+    }
+    return adjacency, stats
+
+# --- Functions for the process pool ---
+def topology_to_arrays(topology):
+    # Compact, picklable form: cells -> faces -> loops (outer first) -> [x, y, z]
+    cells = []
+    for cell in Topology.Cells(topology):
+        faces = []
+        for face in Topology.Faces(cell):
+            loops = [Face.ExternalBoundary(face)] + Face.InternalBoundaries(face)
+            faces.append([[Vertex.Coordinates(vertex, mantissa=15) for vertex in Topology.Vertices(loop)] for loop in loops])
+        cells.append(faces)
+    return cells
+
+def topology_from_arrays(cells):
+    rebuilt = []
+    for faces in cells:
+        topologic_faces = []
+        for loops in faces:
+            wires = [Wire.ByVertices([Vertex.ByCoordinates(x, y, z) for x, y, z in loop], close=True) for loop in loops]
+            if len(wires) == 1:
+                topologic_faces.append(Face.ByWire(wires[0]))
+            else:
+                topologic_faces.append(Face.ByWires(wires[0], wires[1:]))
+        rebuilt.append(Cell.ByFaces(topologic_faces))
+
+    # A single cell is handed over as is, layered walls as a cluster of their cells
+    if len(rebuilt) == 1:
+        return rebuilt[0]
+    return Cluster.ByTopologies(rebuilt)
+
+_worker_arrays = None
+_worker_topologies = {}
+_worker_check = None
+
+def _init_worker(arrays, check):
+    global _worker_arrays, _worker_topologies, _worker_check
+    _worker_arrays = arrays
+    _worker_topologies = {}
+    _worker_check = check
+
+def _worker_topology(index):
+    # Every worker rebuilds an element only once, on first use
+    if index not in _worker_topologies:
+        _worker_topologies[index] = topology_from_arrays(_worker_arrays[index])
+    return _worker_topologies[index]
+
+def _check_chunk(chunk):
+    return [_worker_check(_worker_topology(i), _worker_topology(j)) for i, j in chunk]
+
+class PairPool:
+    # Process pool for the pair checks of a whole run. The topologies are serialized and handed to the workers once,
+    # every block of pairs (e.g. between two checkpoints) is submitted to the same workers.
+    def __init__(self, topologies, check, workers):
+        self.workers = workers
+        arrays = [topology_to_arrays(topology) for topology in topologies]
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(arrays, check))
+
+    def run(self, pairs, chunk_size=None):
+        # Results come back in the order of pairs, independent of the worker scheduling
+        if chunk_size is None:
+            chunk_size = max(1, len(pairs) // (self.workers * 8))
+        chunks = [pairs[start:start + chunk_size] for start in range(0, len(pairs), chunk_size)]
+
+        results = []
+        for index, chunk_results in enumerate(self.executor.map(_check_chunk, chunks), start=1):
+            print(f"Chunk {index} / {len(chunks)} done")
+            results.extend(chunk_results)
+        return results
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def parallel_pair_checks(pairs, topologies, check, workers, chunk_size=None):
+    # One-off pool for a single list of pairs
+    with PairPool(topologies, check, workers) as pool:
+        return pool.run(pairs, chunk_size)
+
+def run_pair_checks(pairs, topologies, check, workers=1):
+    if workers > 1:
+        return parallel_pair_checks(pairs, topologies, check, workers)
+    return [check(topologies[i], topologies[j]) for i, j in pairs]
+
+# --- Supervised pair checks with a time budget ---
+def _watchdog_worker(connection, arrays, check):
+    # Pairs arrive one by one, the supervisor kills the process if a pair takes too long
+    _init_worker(arrays, check)
+    while True:
+        pair = connection.recv()
+        if pair is None:
+            break
+        try:
+            connection.send(("done", _worker_check(_worker_topology(pair[0]), _worker_topology(pair[1]))))
+        except Exception as e:
+            connection.send(("error", str(e)))
+
+class PairWatchdog:
+    # Worker processes for the pair checks, each pair gets budget seconds.
+    # A worker over budget is killed and replaced, a crashed worker is replaced, both pairs are reported as failed.
+    def __init__(self, topologies, check, workers=1, budget=60.0):
+        self.arrays = [topology_to_arrays(topology) for topology in topologies]
+        self.check = check
+        self.budget = budget
+        self.workers = [self._start_worker() for _ in range(max(1, workers))]
+
+    def _start_worker(self):
+        connection, worker_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_watchdog_worker, args=(worker_connection, self.arrays, self.check), daemon=True)
+        process.start()
+        return {"process": process, "connection": connection, "task": None, "deadline": None}
+
+    def _restart_worker(self, worker):
+        worker["connection"].close()
+        worker.update(self._start_worker())
+
+    def run(self, pairs):
+        # Results in the order of pairs, None for pairs over budget or failed; offsets of those pairs
+        results = [None] * len(pairs)
+        failed = []
+        pending = list(enumerate(pairs))
+        pending.reverse()
+
+        while True:
+            for worker in self.workers:
+                if worker["task"] is None and pending:
+                    worker["task"] = pending.pop()
+                    worker["deadline"] = time.monotonic() + self.budget
+                    try:
+                        worker["connection"].send(worker["task"][1])
+                    except OSError:
+                        # Worker died after its last pair, the pair goes to a new one
+                        self._restart_worker(worker)
+                        worker["connection"].send(worker["task"][1])
+            busy = [worker for worker in self.workers if worker["task"] is not None]
+            if not busy:
+                return results, failed
+
+            timeout = max(0.0, min(worker["deadline"] for worker in busy) - time.monotonic())
+            ready = wait([worker["connection"] for worker in busy], timeout=timeout)
+            for worker in busy:
+                offset, pair = worker["task"]
+                if worker["connection"] in ready:
+                    try:
+                        status, result = worker["connection"].recv()
+                    except (EOFError, OSError):
+                        # Worker crashed in the check (e.g. a segfault in OpenCascade), same as a timeout
+                        worker["process"].join()
+                        print(f"Worker crashed on pair {pair} (exit code {worker['process'].exitcode}), worker restarted")
+                        failed.append(offset)
+                        self._restart_worker(worker)
+                        continue
+                    if status == "done":
+                        results[offset] = result
+                    else:
+                        logging.debug(f"Pair check {pair} failed: {result}")
+                        failed.append(offset)
+                    worker["task"] = None
+                elif time.monotonic() >= worker["deadline"]:
+                    print(f"Pair {pair} exceeded the time budget of {self.budget} s, worker killed")
+                    worker["process"].kill()
+                    worker["process"].join()
+                    failed.append(offset)
+                    self._restart_worker(worker)
+
+    def close(self):
+        for worker in self.workers:
+            if worker["task"] is None and worker["process"].is_alive():
+                try:
+                    worker["connection"].send(None)
+                except OSError:
+                    pass
+                worker["process"].join(timeout=5)
+            if worker["process"].is_alive():
+                worker["process"].kill()
+                worker["process"].join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
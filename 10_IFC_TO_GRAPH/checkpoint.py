@@ -0,0 +1,103 @@
+import os
+import json
+import hashlib
+from csv_output import StreamingCSVWriter
+
+# Checkpoints of interrupted runs, next to the Output CSVs
+CHECKPOINT_DIR = ".checkpoint"
+
+def run_signature(*parts):
+    # Element keys, pair list and options of a run, a checkpoint is only resumed by the same run
+    sha = hashlib.sha256()
+    for part in parts:
+        sha.update(json.dumps(part).encode("utf-8"))
+    return sha.hexdigest()
+
+def checkpoint_path(step):
+    return os.path.join(CHECKPOINT_DIR, f"{step}.json")
+
+def load_checkpoint(step, signature):
+    path = checkpoint_path(step)
+    if not os.path.exists(path):
+        print("No checkpoint found, starting from the first pair")
+        return None
+    with open(path, "r") as f:
+        state = json.load(f)
+    if state.get("signature") != signature:
+        print("Checkpoint belongs to other walls, pairs or options, starting from the first pair")
+        return None
+    return state
+
+def save_checkpoint(step, state):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    temp_path = checkpoint_path(step) + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, checkpoint_path(step))
+
+def remove_checkpoint(step):
+    if os.path.exists(checkpoint_path(step)):
+        os.remove(checkpoint_path(step))
+
+# --- Ordered pair loop with checkpoints, shared by Output01 and Output06 ---
+def write_completed_rows(writer, keys, touching, written, upto, empty_rows=False):
+    # Rows of the elements written .. upto-1, returns the new count of elements passed.
+    # Rows written by an interrupted run after its last checkpoint are not written again.
+    # empty_rows: also a row for elements without partners (Output06 lists every wall)
+    for index in range(written, upto):
+        if (touching[index] or empty_rows) and not writer.is_done(keys[index]):
+            writer.writerow([keys[index], ",".join(keys[j] for j in sorted(touching[index]))])
+    return upto
+
+def checkpointed_pairs(step, signature, keys, pairs, check_block, every, resume=False, output_file=None, empty_rows=False):
+    # check_block(block_start, block): results of the pairs of a block in pair order (list or generator),
+    # the engine specific part of the loop. A checkpoint is saved after every block of every pairs.
+    # An element's row is final once the loop has moved past it (pairs are ordered by the first element),
+    # so with output_file the rows go out right away. An incremental run needs all results before patching.
+    # Returns {index: [indices of the touching elements]}
+    state = load_checkpoint(step, signature) if resume else None
+    position = state["position"] if state else 0
+    hits = state["hits"] if state else []
+    written = state.get("written", 0) if state else 0
+    touching = {index: [] for index in range(len(keys))}
+    for i, j in hits:
+        touching[i].append(j)
+        touching[j].append(i)
+    if state:
+        print(f"Resuming at pair {position} / {len(pairs)} with {len(hits)} touching pairs")
+
+    writer = StreamingCSVWriter(output_file, resume=state is not None) if output_file else None
+    try:
+        current = None
+        for block_start in range(position, len(pairs), every):
+            block = pairs[block_start:block_start + every]
+            results = iter(check_block(block_start, block))
+            for offset, (i, j) in enumerate(block):
+                if i != current:
+                    print(f"Check {i+1} / {len(keys)}")
+                    current = i
+                    if writer:
+                        written = max(written, write_completed_rows(writer, keys, touching, written, i, empty_rows))
+
+                if next(results):
+                    touching[i].append(j)
+                    touching[j].append(i)
+                    hits.append([i, j])
+                position = block_start + offset + 1
+
+            if writer:
+                writer.flush()
+            save_checkpoint(step, {"signature": signature, "position": position, "hits": hits, "written": written})
+    except BaseException:
+        # Keep everything up to the last finished pair, --resume continues from there
+        if writer:
+            writer.abort()
+        save_checkpoint(step, {"signature": signature, "position": position, "hits": hits, "written": written})
+        print(f"Interrupted at pair {position} / {len(pairs)}, checkpoint saved (continue with --resume)")
+        raise
+
+    if writer:
+        write_completed_rows(writer, keys, touching, written, len(keys), empty_rows)
+        writer.close()
+    remove_checkpoint(step)
+    return touching
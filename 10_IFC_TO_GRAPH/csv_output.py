@@ -0,0 +1,75 @@
+import os
+import csv
+import io
+
+# --- Streaming output for the Output0x CSVs ---
+class StreamingCSVWriter:
+    # Rows go to <path>.partial as soon as an element is finished and are flushed every flush_every rows.
+    # close() renames the finished file to <path>, an interrupted run never leaves a half written Output file.
+    def __init__(self, path, key_column=0, flush_every=100, resume=False):
+        self.path = path
+        self.partial_path = f"{path}.partial"
+        self.key_column = key_column
+        self.flush_every = flush_every
+        self.done = set()
+        self.rows = 0
+        self.unflushed = 0
+
+        if resume and os.path.exists(self.partial_path):
+            self._load_partial()
+            mode = "a"
+            print(f"Resuming {path}: {len(self.done)} elements already written")
+        else:
+            mode = "w"
+        self.file = open(self.partial_path, mode, newline='')
+        self.writer = csv.writer(self.file, delimiter=';')
+
+    def _load_partial(self):
+        # Keep the complete rows of the interrupted run, a row cut off by the crash is dropped
+        with open(self.partial_path, "r", newline='') as f:
+            text = f.read()
+        text = text[:text.rfind("\n") + 1]
+        with open(self.partial_path, "w", newline='') as f:
+            f.write(text)
+        for row in csv.reader(io.StringIO(text, newline=''), delimiter=';'):
+            if row:
+                self.done.add(row[self.key_column])
+                self.rows += 1
+
+    def is_done(self, key):
+        # Key (GUID) of an element written by an earlier, interrupted run
+        return key in self.done
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        self.done.add(row[self.key_column])
+        self.rows += 1
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unflushed = 0
+
+    def close(self):
+        # Finished: atomic replace of the Output file
+        self.flush()
+        self.file.close()
+        os.replace(self.partial_path, self.path)
+
+    def abort(self):
+        # Interrupted: the rows so far stay in the .partial file for a resumed run
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,134 @@
+import os
+import csv
+
+# pyarrow is optional, without it only the CSVs are written
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pc = None
+    pq = None
+
+# --- Edge list of the Output CSVs ---
+# Relation of every Output file, one edge per GUID in the comma-joined list of a row
+RELATIONS = {
+    "Output01_RoomToRoom_BySeparationLine.csv": "BySeparationLine",
+    "Output02_RoomToRoom_ByDoors.csv": "ByDoor",
+    "Output03_RoomToRoom_ByWindows.csv": "ByWindow",
+    "Output04_RoomBoundingWalls.csv": "BoundingWall",
+    "Output05_Hosts_of_WindowsAndDoors.csv": "HostedBy",
+    "Output06_Wall_Adjacancy.csv": "WallAdjacency",
+}
+
+_missing_pyarrow_reported = False
+
+def pyarrow_available():
+    global _missing_pyarrow_reported
+    if pa is None and not _missing_pyarrow_reported:
+        print("pyarrow is not installed, no Parquet edge lists are written")
+        _missing_pyarrow_reported = True
+    return pa is not None
+
+def parquet_path(csv_file):
+    return os.path.splitext(csv_file)[0] + ".parquet"
+
+def building_name(ifc_file, storey_name):
+    # IfcBuilding that aggregates the storey, the first building of the file otherwise
+    for storey in ifc_file.by_type("IfcBuildingStorey"):
+        if storey.Name == storey_name:
+            for rel in storey.Decomposes:
+                if rel.RelatingObject.is_a("IfcBuilding"):
+                    return rel.RelatingObject.Name or rel.RelatingObject.GlobalId
+    buildings = ifc_file.by_type("IfcBuilding")
+    return (buildings[0].Name or buildings[0].GlobalId) if buildings else ""
+
+def csv_edges(csv_file):
+    # (source, target) pairs, Output05 rows are "type;element;wall"
+    hosts = os.path.basename(csv_file) == "Output05_Hosts_of_WindowsAndDoors.csv"
+    sources = []
+    targets = []
+    with open(csv_file, "r", newline="") as file:
+        for row in csv.reader(file, delimiter=";"):
+            if hosts and len(row) > 2:
+                sources.append(row[1])
+                targets.append(row[2])
+            elif not hosts and len(row) > 1:
+                for guid in row[1].split(","):
+                    if guid:
+                        sources.append(row[0])
+                        targets.append(guid)
+    return sources, targets
+
+def constant_column(value, length):
+    # Relation, storey and building are the same for the whole file, dictionary encoded they cost one index per edge
+    return pa.DictionaryArray.from_arrays(pa.array([0] * length, type=pa.int32()), pa.array([value], type=pa.string()))
+
+def write_edge_parquet(csv_file, storey_name, building):
+    # Output0x.parquet next to the finished CSV, replaced atomically like the CSV itself
+    if not pyarrow_available() or not os.path.exists(csv_file):
+        return None
+    sources, targets = csv_edges(csv_file)
+    table = pa.table({
+        "source_guid": pa.array(sources, type=pa.string()),
+        "target_guid": pa.array(targets, type=pa.string()),
+        "relation": constant_column(RELATIONS[os.path.basename(csv_file)], len(sources)),
+        "storey": constant_column(storey_name, len(sources)),
+        "building": constant_column(building, len(sources)),
+    })
+    path = parquet_path(csv_file)
+    pq.write_table(table, f"{path}.partial")
+    os.replace(f"{path}.partial", path)
+    print(f"-- {len(sources)} edges have been written to {os.path.basename(path)} --")
+    return path
+
+def write_edge_parquets(csv_files, storey_name, building):
+    for csv_file in csv_files:
+        write_edge_parquet(csv_file, storey_name, building)
+
+# --- Reading ---
+def is_fresh(csv_file):
+    # Parquet file written after the last change of its CSV (an old step version only rewrites the CSV)
+    path = parquet_path(csv_file)
+    return os.path.exists(path) and (not os.path.exists(csv_file) or os.path.getmtime(path) >= os.path.getmtime(csv_file))
+
+def read_edges(paths, relations=None):
+    # Memory-mapped Parquet files as one Arrow table, the column buffers are not copied
+    tables = [pq.read_table(path, memory_map=True) for path in paths if os.path.exists(path)]
+    if not tables:
+        return None
+    table = pa.concat_tables(tables)
+    if relations is not None:
+        table = table.filter(pc.is_in(table.column("relation").cast(pa.string()), value_set=pa.array(relations)))
+    return table
+
+def read_building_edges(folder, relations=None):
+    # All Output0x.parquet files of the storey folders below folder (a building or the whole corpus)
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.startswith("Output0") and name.endswith(".parquet"))
+    return read_edges(sorted(paths), relations)
+
+def adjacency_rows(csv_file):
+    # (source, [targets]) per row, from the Parquet edge list if it is up to date, from the CSV otherwise
+    if pa is not None and is_fresh(csv_file):
+        table = pq.read_table(parquet_path(csv_file), columns=["source_guid", "target_guid"], memory_map=True)
+        sources = table.column("source_guid").combine_chunks()
+        targets = table.column("target_guid").combine_chunks()
+        if len(sources) == 0:
+            return
+        # Edges of a row are consecutive, a new source starts the next row. The row offsets are found
+        # on the columns and the targets are grouped into one list array, Python objects only for the yielded rows
+        changed = pc.not_equal(sources.slice(1), sources.slice(0, len(sources) - 1))
+        starts = pc.add(pc.indices_nonzero(changed), 1).cast(pa.int32())
+        offsets = pa.concat_arrays([pa.array([0], type=pa.int32()), starts, pa.array([len(sources)], type=pa.int32())])
+        rows = pa.ListArray.from_arrays(offsets, targets)
+        row_sources = sources.take(offsets.slice(0, len(offsets) - 1))
+        yield from zip(row_sources.to_pylist(), rows.to_pylist())
+        return
+
+    with open(csv_file, "r", newline="") as file:
+        for row in csv.reader(file, delimiter=";"):
+            if row:
+                yield row[0], [guid for guid in row[1].split(",") if guid] if len(row) > 1 else []
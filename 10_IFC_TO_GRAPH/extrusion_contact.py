@@ -0,0 +1,129 @@
+import numpy as np
+
+# Same default as the topologicpy booleans, in meters. Rooms are in meters, wall layers in project units:
+# callers with project units convert it with project_unit_scale like the layer tolerance
+DEFAULT_TOLERANCE = 0.0001
+
+# --- Functions to describe an element as a vertical prism ---
+def extrusion_prism(local_points, extrusion_vector, rotation_matrix=None, translation=None, scale=1.0, tolerance=DEFAULT_TOLERANCE):
+    # Profile in world XY plus Z range of a straight extrusion, None if it is not a vertical prism
+    # Without rotation_matrix / translation the points and vector are already in world coordinates
+    rotation_matrix = np.eye(3) if rotation_matrix is None else np.asarray(rotation_matrix, dtype=float)
+    translation = np.zeros(3) if translation is None else np.asarray(translation, dtype=float)
+    points = np.asarray(local_points, dtype=float)
+    world_points = (points @ rotation_matrix.T + translation) * scale
+    world_extrusion = rotation_matrix @ np.asarray(extrusion_vector, dtype=float) * scale
+
+    # Only extrusions along Z from a horizontal profile are handled analytically
+    if np.any(np.abs(world_extrusion[:2]) > tolerance):
+        return None
+    if np.ptp(world_points[:, 2]) > tolerance:
+        return None
+
+    profile = world_points[:, :2]
+    # IfcIndexedPolyCurve may repeat the first point at the end
+    if len(profile) > 1 and np.allclose(profile[0], profile[-1], atol=tolerance):
+        profile = profile[:-1]
+
+    base_z = world_points[0, 2]
+    top_z = base_z + world_extrusion[2]
+    return {
+        "profile": profile,
+        "z_min": min(base_z, top_z),
+        "z_max": max(base_z, top_z)
+    }
+
+def profile_segments(profile, tolerance=DEFAULT_TOLERANCE):
+    starts = profile
+    ends = np.roll(profile, -1, axis=0)
+    lengths = np.linalg.norm(ends - starts, axis=1)
+    keep = lengths > tolerance
+    return starts[keep], ends[keep], lengths[keep]
+
+# --- Functions for the contact test ---
+def segments_overlap(profile1, profile2, tolerance=DEFAULT_TOLERANCE):
+    # True if any segment of profile1 is collinear with and overlaps a segment of profile2
+    starts1, ends1, lengths1 = profile_segments(profile1, tolerance)
+    starts2, ends2, lengths2 = profile_segments(profile2, tolerance)
+    if len(starts1) == 0 or len(starts2) == 0:
+        return False
+
+    # Unit directions of profile1 segments, broadcast against all profile2 segments
+    directions = (ends1 - starts1) / lengths1[:, None]
+    to_start = starts2[None, :, :] - starts1[:, None, :]
+    to_end = ends2[None, :, :] - starts1[:, None, :]
+
+    # Perpendicular distance of both profile2 endpoints from the profile1 line
+    distance_start = np.abs(directions[:, None, 0] * to_start[:, :, 1] - directions[:, None, 1] * to_start[:, :, 0])
+    distance_end = np.abs(directions[:, None, 0] * to_end[:, :, 1] - directions[:, None, 1] * to_end[:, :, 0])
+    collinear = (distance_start <= tolerance) & (distance_end <= tolerance)
+
+    # Overlap length of the projected intervals along the profile1 segment
+    t_start = np.einsum("ik,ijk->ij", directions, to_start)
+    t_end = np.einsum("ik,ijk->ij", directions, to_end)
+    low = np.maximum(np.minimum(t_start, t_end), 0.0)
+    high = np.minimum(np.maximum(t_start, t_end), lengths1[:, None])
+    overlapping = (high - low) > tolerance
+
+    return bool(np.any(collinear & overlapping))
+
+def profile_boxes_overlap(profile1, profile2, tolerance=DEFAULT_TOLERANCE):
+    # Positive-area overlap of the XY extents
+    low = np.maximum(profile1.min(axis=0), profile2.min(axis=0))
+    high = np.minimum(profile1.max(axis=0), profile2.max(axis=0))
+    return bool(np.all(high - low > tolerance))
+
+def prisms_share_face(prism1, prism2, tolerance=DEFAULT_TOLERANCE):
+    # True / False, or None if the pair has to be decided by a boolean merge
+    z_overlap = min(prism1["z_max"], prism2["z_max"]) - max(prism1["z_min"], prism2["z_min"])
+
+    if z_overlap > tolerance:
+        # Side by side: a shared face needs collinear, overlapping profile segments
+        if segments_overlap(prism1["profile"], prism2["profile"], tolerance):
+            return True
+        # Interpenetrating profiles (e.g. layers at wall joins) share faces after the merge, leave them to it
+        if profile_boxes_overlap(prism1["profile"], prism2["profile"], tolerance):
+            return None
+        return False
+
+    if z_overlap >= -tolerance:
+        # Stacked on top of each other: leave possible floor/ceiling contact to the merge
+        if profile_boxes_overlap(prism1["profile"], prism2["profile"], tolerance):
+            return None
+
+    return False
+
+def extrusion_pair_checks(pairs, prisms, tolerance=DEFAULT_TOLERANCE):
+    # Results aligned with pairs, None where an element is no prism or the test is undecided
+    results = []
+    for i, j in pairs:
+        if prisms[i] is None or prisms[j] is None:
+            results.append(None)
+        else:
+            results.append(prisms_share_face(prisms[i], prisms[j], tolerance))
+    return results
+
+def layered_prisms_contact(prisms1, prisms2, tolerance=DEFAULT_TOLERANCE):
+    # Walls: True if a layer pair is in contact by its prisms, otherwise False and the layer pairs
+    # the prisms cannot decide (layers without a prism, e.g. IfcPolygonalFaceSet, or pairs prisms_share_face leaves open)
+    pending = []
+    for index1, prism1 in enumerate(prisms1):
+        for index2, prism2 in enumerate(prisms2):
+            if prism1 is not None and prism2 is not None:
+                decision = prisms_share_face(prism1, prism2, tolerance)
+                if decision:
+                    return True, []
+                if decision is False:
+                    continue
+            pending.append((index1, index2))
+    return False, pending
+
+def layered_prisms_share_face(prisms1, prisms2, cells1, cells2, fallback, tolerance=DEFAULT_TOLERANCE):
+    # Walls: any layer pair in contact; layer pairs the prisms cannot decide use the fallback merge
+    touching, pending = layered_prisms_contact(prisms1, prisms2, tolerance)
+    if touching:
+        return True
+    for index1, index2 in pending:
+        if fallback(cells1[index1], cells2[index2]):
+            return True
+    return False
@@ -0,0 +1,124 @@
+import os
+import hashlib
+import pickle
+from contextlib import contextmanager
+
+# File locks serialize the saves of parallel storeys, not available on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from topologicpy.Topology import Topology
+from topologicpy.Dictionary import Dictionary
+from adjacency_functions import topology_to_arrays, topology_from_arrays
+
+# Bump when the reconstruction code changes, so old entries are no longer used
+CACHE_VERSION = 4
+DEFAULT_CACHE_DIR = ".geometry_cache"
+
+# --- Keys ---
+def file_hash(file_path, chunk_size=1 << 20):
+    # Content hash, a renamed or touched file keeps its cache
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+# Content hash per (path, mtime, size) of this process, the caches of all storeys and kinds share one read of the file
+_file_hashes = {}
+
+def ifc_file_hash(file_path):
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        _file_hashes[key] = file_hash(file_path)
+    return _file_hashes[key]
+
+def params_hash(params):
+    text = repr(sorted((params or {}).items())) + f"|v{CACHE_VERSION}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+# --- Topologies as plain data ---
+def topology_to_entry(topology):
+    # Final vertices / faces of every cell plus the dictionary (e.g. the layer material)
+    dictionary = Topology.Dictionary(topology)
+    values = Dictionary.PythonDictionary(dictionary) if dictionary else {}
+    return {"cells": topology_to_arrays(topology), "dictionary": values}
+
+def topology_from_entry(entry):
+    topology = topology_from_arrays(entry["cells"])
+    if entry["dictionary"]:
+        keys = list(entry["dictionary"].keys())
+        values = [entry["dictionary"][key] for key in keys]
+        topology = Topology.AddDictionary(topology, Dictionary.ByKeysValues(keys, values))
+    return topology
+
+def entry_points(entry):
+    # All vertex coordinates of a cached element, e.g. to seed the vertex welder
+    return [point for layer in entry["layers"] for faces in layer["cells"] for loops in faces for loop in loops for point in loop]
+
+@contextmanager
+def file_lock(path):
+    # Exclusive lock on <path>.lock around the read-merge-replace of a file shared by processes
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# --- Cache per IFC file, element kind and reconstruction parameters ---
+class GeometryCache:
+    def __init__(self, ifc_file_path, kind, params=None, cache_dir=DEFAULT_CACHE_DIR):
+        # cache_dir None disables the cache, get() then always misses
+        self.enabled = bool(cache_dir)
+        self.entries = {}
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+        self.path = None
+
+        if self.enabled:
+            name = f"{ifc_file_hash(ifc_file_path)[:32]}_{kind}_{params_hash(params)}.pkl"
+            self.path = os.path.join(cache_dir, name)
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as f:
+                    self.entries = pickle.load(f)
+
+    def get(self, guid):
+        entry = self.entries.get(guid) if self.enabled else None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, guid, entry):
+        if self.enabled:
+            self.entries[guid] = entry
+            self.changed = True
+
+    def save(self):
+        if not (self.enabled and self.changed):
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Read, merge and replace under one lock, otherwise two storeys saving at the same time
+        # both read the old file and the second replace drops the entries of the first
+        with file_lock(self.path):
+            # Other storeys of the building may have saved to the same file in the meantime
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as f:
+                    self.entries = {**pickle.load(f), **self.entries}
+            # Write next to the target and swap, an interrupted run never leaves a broken cache
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                pickle.dump(self.entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path)
+        self.changed = False
+
+    def report(self):
+        print(f"Geometry cache: {self.hits} loaded, {self.misses} reconstructed")
@@ -1,6 +1,9 @@
 import ifcopenshell
 import csv
 import math
+import re
+from csv_output import StreamingCSVWriter
+from edge_table import write_edge_parquets, building_name
 from topologicpy.Topology import Topology
 from topologicpy.Vertex import Vertex
 from topologicpy.Face import Face
@@ -150,28 +153,64 @@ def topology_spaces_to_csv(building):
 
     print("Data has been written to Output01_RoomToRoom_BySeparationLine.csv")
 
+# --- Relationship index shared by the extractors below ---
+def build_relationship_index(ifc_file):
+    # One pass over the relationships of the file instead of a scan per element
+    boundaries_by_element = {}
+    for rel in ifc_file.by_type("IfcRelSpaceBoundary"):
+        element = rel.RelatedBuildingElement
+        if element:
+            boundaries_by_element.setdefault(element.id(), []).append(rel)
+
+    # Same concatenation as before, subtypes are listed by every by_type call they match
+    boundaries_by_space = {}
+    for rel in ifc_file.by_type("IfcRelSpaceBoundary") + ifc_file.by_type("IfcRelSpaceBoundary1stLevel") + ifc_file.by_type("IfcRelSpaceBoundary2ndLevel"):
+        boundaries_by_space.setdefault(rel.RelatingSpace.GlobalId, []).append(rel)
+
+    # Keep the first relation found, like the former linear scans
+    opening_to_host = {}
+    for rel in ifc_file.by_type("IfcRelVoidsElement"):
+        opening_to_host.setdefault(rel.RelatedOpeningElement.id(), rel.RelatingBuildingElement)
+
+    filler_to_opening = {}
+    for rel in ifc_file.by_type("IfcRelFillsElement"):
+        filler_to_opening.setdefault(rel.RelatedBuildingElement.id(), rel.RelatingOpeningElement)
+
+    return {
+        "boundaries_by_element": boundaries_by_element,
+        "boundaries_by_space": boundaries_by_space,
+        "opening_to_host": opening_to_host,
+        "filler_to_opening": filler_to_opening
+    }
+
 # --- Functions for doorinfo_to_csv ---
-def doorinfo_to_csv(ifc_file, all_doors, target_storey):
+def doorinfo_to_csv(ifc_file, all_doors, target_storey, index=None, resume=False):
+    if index is None:
+        index = build_relationship_index(ifc_file)
+
+    door_ids = {door.id() for door in all_doors}
     door_to_room = {}
-    for rel in ifc_file.by_type("IfcRelSpaceBoundary"):
-        if rel.RelatedBuildingElement in all_doors:
-            door = rel.RelatedBuildingElement
+    for element_id, rels in index["boundaries_by_element"].items():
+        if element_id in door_ids:
+            door = rels[0].RelatedBuildingElement
             door_global_id = door.GlobalId
             
             door_storey = door.ContainedInStructure
             if door_storey and door_storey[0].RelatingStructure == target_storey:
-                room = rel.RelatingSpace
-                if room:
-                    room_global_id = room.GlobalId
-                    if door_global_id in door_to_room:
-                        door_to_room[door_global_id].append(room_global_id)
-                    else:
-                        door_to_room[door_global_id] = [room_global_id]
+                for rel in rels:
+                    room = rel.RelatingSpace
+                    if room:
+                        room_global_id = room.GlobalId
+                        if door_global_id in door_to_room:
+                            door_to_room[door_global_id].append(room_global_id)
+                        else:
+                            door_to_room[door_global_id] = [room_global_id]
 
     if door_to_room:
-        with open('Output02_RoomToRoom_ByDoors.csv', 'w', newline='') as csvfile:
-            csvwriter = csv.writer(csvfile, delimiter=';')
+        with StreamingCSVWriter('Output02_RoomToRoom_ByDoors.csv', resume=resume) as csvwriter:
             for door_global_id, room_global_ids in door_to_room.items():
+                if csvwriter.is_done(door_global_id):
+                    continue
                 room_guids_combined = ",".join(room_global_ids)
                 csvwriter.writerow([door_global_id, room_guids_combined])
         print("Data has been written to Output02_RoomToRoom_ByDoors.csv")
@@ -185,96 +224,82 @@ def get_storey(element):
             return rel.RelatingStructure
     return None
 
-def windowinfo_to_csv(ifc_file, ifc_windows, target_storey):
+def windowinfo_to_csv(ifc_file, ifc_windows, target_storey, index=None, resume=False):
+    if index is None:
+        index = build_relationship_index(ifc_file)
+
+    window_ids = {window.id() for window in ifc_windows}
     window_to_room = {}
-    for rel in ifc_file.by_type("IfcRelSpaceBoundary"):
-        if rel.RelatedBuildingElement in ifc_windows:
-            window = rel.RelatedBuildingElement
+    for element_id, rels in index["boundaries_by_element"].items():
+        if element_id in window_ids:
+            window = rels[0].RelatedBuildingElement
             window_guid = window.GlobalId
             
             window_storey = get_storey(window)
             if window_storey == target_storey:
-                room = rel.RelatingSpace
-                if room:
-                    room_guid = room.GlobalId
-                    if window_guid not in window_to_room:
-                        window_to_room[window_guid] = []
-                    window_to_room[window_guid].append(room_guid)
-
-    with open('Output03_RoomToRoom_ByWindows.csv', 'w', newline='') as csvfile:
-        csvwriter = csv.writer(csvfile, delimiter=';')
+                for rel in rels:
+                    room = rel.RelatingSpace
+                    if room:
+                        room_guid = room.GlobalId
+                        if window_guid not in window_to_room:
+                            window_to_room[window_guid] = []
+                        window_to_room[window_guid].append(room_guid)
+
+    with StreamingCSVWriter('Output03_RoomToRoom_ByWindows.csv', resume=resume) as csvwriter:
         for window_guid, room_guids in window_to_room.items():
+            if csvwriter.is_done(window_guid):
+                continue
             row = [window_guid, ",".join(room_guids)]
             csvwriter.writerow(row)
 
     print("Results have been saved to Output03_RoomToRoom_ByWindows.csv")
 
 # --- Functions for room_bounding_walls_to_csv ---
-def room_bounding_walls_to_csv(ifc_file, filtered_spaces):
-    space_to_walls = []
-
-    for space in filtered_spaces:
-        space_guid = space.GlobalId
-        walls = []
-        for rel_space_boundary in ifc_file.by_type("IfcRelSpaceBoundary") + ifc_file.by_type("IfcRelSpaceBoundary1stLevel") + ifc_file.by_type("IfcRelSpaceBoundary2ndLevel"):
-            if rel_space_boundary.RelatingSpace.GlobalId == space.GlobalId:
+def room_bounding_walls_to_csv(ifc_file, filtered_spaces, index=None, resume=False):
+    if index is None:
+        index = build_relationship_index(ifc_file)
+
+    # Each space is written as soon as it is analysed
+    with StreamingCSVWriter('Output04_RoomBoundingWalls.csv', resume=resume) as csvwriter:
+        for space in filtered_spaces:
+            space_guid = space.GlobalId
+            if csvwriter.is_done(space_guid):
+                continue
+
+            walls = []
+            for rel_space_boundary in index["boundaries_by_space"].get(space_guid, []):
                 if rel_space_boundary.RelatedBuildingElement and rel_space_boundary.RelatedBuildingElement.is_a("IfcWall"):
                     wall_guid = rel_space_boundary.RelatedBuildingElement.GlobalId
                     walls.append(wall_guid)
 
-        space_to_walls.append({
-            "space_guid": space_guid,
-            "walls": walls
-        })
-
-        print(f"Space ({space_guid}) analysed - Found {len(walls)} Walls")
+            csvwriter.writerow([space_guid, ",".join(walls)])
 
-    with open('Output04_RoomBoundingWalls.csv', 'w', newline='') as csvfile:
-        csvwriter = csv.writer(csvfile, delimiter=';')
-        for entry in space_to_walls:
-            csvwriter.writerow([
-                entry["space_guid"],
-                ",".join(entry["walls"])
-            ])
+            print(f"Space ({space_guid}) analysed - Found {len(walls)} Walls")
 
     print("Data has been written to Output04_RoomBoundingWalls.csv")
 
 # --- Functions for hosts_of_windows_and_doors ---
-def hosts_of_windows_and_doors(ifc_file, target_storey):
-    elements_to_walls = []
-
-    def find_hosting_wall(opening_element):
-        for rel_voids in ifc_file.by_type("IfcRelVoidsElement"):
-            if rel_voids.RelatedOpeningElement == opening_element:
-                return rel_voids.RelatingBuildingElement
-        return None
-
-    for rel_contained in target_storey.ContainsElements:
-        for element in rel_contained.RelatedElements:
-            if element.is_a("IfcDoor") or element.is_a("IfcWindow"):
-                element_type = element.is_a()
-                element_guid = element.GlobalId
-
-                target_opening = None
-                for rel_fills in ifc_file.by_type("IfcRelFillsElement"):
-                    if rel_fills.RelatedBuildingElement == element:
-                        target_opening = rel_fills.RelatingOpeningElement
-                        break
-
-                if target_opening:
-                    hosting_wall = find_hosting_wall(target_opening)
-                    if hosting_wall:
-                        wall_guid = hosting_wall.GlobalId
-                        elements_to_walls.append({
-                            "element_type": element_type,
-                            "element_guid": element_guid,
-                            "wall_guid": wall_guid
-                        })
-
-    with open('Output05_Hosts_of_WindowsAndDoors.csv', 'w', newline='') as csvfile:
-        csvwriter = csv.writer(csvfile, delimiter=';')
-        for entry in elements_to_walls:
-            csvwriter.writerow([entry["element_type"], entry["element_guid"], entry["wall_guid"]])
+def hosts_of_windows_and_doors(ifc_file, target_storey, index=None, resume=False):
+    if index is None:
+        index = build_relationship_index(ifc_file)
+
+    # Rows are (type, element GUID, wall GUID), the element GUID is the key for resuming
+    with StreamingCSVWriter('Output05_Hosts_of_WindowsAndDoors.csv', key_column=1, resume=resume) as csvwriter:
+        for rel_contained in target_storey.ContainsElements:
+            for element in rel_contained.RelatedElements:
+                if element.is_a("IfcDoor") or element.is_a("IfcWindow"):
+                    element_type = element.is_a()
+                    element_guid = element.GlobalId
+                    if csvwriter.is_done(element_guid):
+                        continue
+
+                    target_opening = index["filler_to_opening"].get(element.id())
+
+                    if target_opening:
+                        hosting_wall = index["opening_to_host"].get(target_opening.id())
+                        if hosting_wall:
+                            wall_guid = hosting_wall.GlobalId
+                            csvwriter.writerow([element_type, element_guid, wall_guid])
 
     print("Data has been written to Output05_Hosts_of_WindowsAndDoors.csv")
 
@@ -365,3 +390,131 @@ def wall_to_wall_connectivity(ifc_file, storey_name):
             writer.writerow(row)
 
     print(f'Results written to {output_file}')
+
+# --- Output02-05 of a storey ---
+def find_ifc_storey(ifc_file, storey_name):
+    target_storey = None
+    for storey in ifc_file.by_type("IfcBuildingStorey"):
+        if storey.Name == storey_name:
+            target_storey = storey
+            break
+
+    if not target_storey:
+        print(f"Storey with name '{storey_name}' was not found.")
+    else:
+        print(f"Storey '{storey_name}' found. OID: {target_storey.id()}")
+        return target_storey
+
+def filter_ifcspaces_by_storey(spaces, storey_name):
+    filtered_spaces = []
+    for space in spaces:
+        for rel in space.Decomposes:
+            if rel.is_a("IfcRelAggregates") and rel.RelatingObject.is_a("IfcBuildingStorey"):
+                if rel.RelatingObject.Name == storey_name:
+                    filtered_spaces.append(space)
+                    break
+    return filtered_spaces
+
+def filter_spaces_by_name(spaces):
+    # For 0301
+    # if True:
+    #     exclude_pattern = re.compile(r'(-10$|^Area:)')
+    #     filtered_spaces = []
+        
+    #     for space in spaces:
+    #         if not exclude_pattern.search(space.Name):
+    #             filtered_spaces.append(space)
+    #     return filtered_spaces
+
+    # For HUS28
+    # digit_pattern = re.compile(r'^\d{1,5}$')
+    # filtered_spaces = []
+    # for space in spaces:
+    #     if digit_pattern.match(space.Name):
+    #         filtered_spaces.append(space)
+    # return filtered_spaces
+
+    # For 3501
+    exclude_pattern = re.compile(r'^Area:|[-]')
+    filtered_spaces = []
+    for space in spaces:
+        if not exclude_pattern.search(space.Name):
+            filtered_spaces.append(space)
+    return filtered_spaces
+
+def filter_spaces_by_category(spaces, category_value="Rooms"):
+    filtered_spaces = []
+    
+    for space in spaces:
+        # Get the property sets of the space
+        property_sets = space.IsDefinedBy
+        
+        # Iterate through the property sets and find the 'Other' set with Category
+        for prop_set in property_sets:
+            if hasattr(prop_set, "RelatingPropertyDefinition"):
+                props = prop_set.RelatingPropertyDefinition
+                
+                # Check if it's a property set and contains the 'Category' property
+                if hasattr(props, "HasProperties"):
+                    for prop in props.HasProperties:
+                        if prop.Name == "Category" and prop.NominalValue.wrappedValue == category_value:
+                            filtered_spaces.append(space)
+                            break
+                            
+    return filtered_spaces
+
+def storey_relationships_to_csv(ifc_file, storey_name, ifc_spaces=None, ifc_doors=None, ifc_windows=None, relationship_index=None, resume=False):
+    # Find corresponding IfcBuildingStorey
+    ifc_storey = find_ifc_storey(ifc_file, storey_name)
+
+    # ifc_spaces: spaces of the storey if already grouped (building mode), otherwise filtered here
+    if ifc_spaces is None:
+        # Find all IfcSpaces
+        ifc_spaces = ifc_file.by_type("IfcSpace")
+        print(f"Number of IfcSpaces found in File: {len(ifc_spaces)}")
+
+        # Filter Spaces by storey
+        ifc_spaces = filter_ifcspaces_by_storey(ifc_spaces, storey_name)
+    print(f"Amount of IfcSpaces in specified storey'{storey_name}': {len(ifc_spaces)}")
+
+    # # Further filter spaces by names containing only digits (1-5 digits)
+    # ifc_spaces = filter_spaces_by_name(ifc_spaces)
+    # print(f"Number of IfcSpaces with valid names: {len(ifc_spaces)}")
+
+    # Filter Spaces by category "Rooms"
+    ifc_spaces = filter_spaces_by_category(ifc_spaces, "Rooms")
+    print(f"Number of IfcSpaces with category 'Rooms': {len(ifc_spaces)}")
+
+    # # Filter spaces by the specified storey name
+    # spaces_in_storey = filter_ifcspaces_by_storey(ifc_spaces, storey_name)
+    # print(f"Number of IfcSpaces matching storey '{storey_name}': {len(spaces_in_storey)}")
+
+    # Index space boundaries, openings and fillings once for all extractors (and storeys in building mode)
+    if relationship_index is None:
+        relationship_index = build_relationship_index(ifc_file)
+
+    # Find all IfcDoors
+    all_doors = ifc_file.by_type("IfcDoor") if ifc_doors is None else ifc_doors
+    # Filter Doors by storey, extract RoomInfos and Write to .csv
+    doorinfo_to_csv(ifc_file, all_doors, ifc_storey, relationship_index, resume)
+
+    ### Determine adjacent rooms using window information
+
+    # Find all IfcWindows
+    all_windows = ifc_file.by_type("IfcWindow") if ifc_windows is None else ifc_windows
+    # Filter Windows by storey, extract RoomInfos and Write to .csv
+    windowinfo_to_csv(ifc_file, all_windows, ifc_storey, relationship_index, resume)
+
+    ### Connectivity between Spaces and Walls
+
+    # Extract adjacent Walls to Rooms from IfcRelation
+    room_bounding_walls_to_csv(ifc_file, ifc_spaces, relationship_index, resume)
+
+    ### Host element of Windows and Doors
+    hosts_of_windows_and_doors(ifc_file, ifc_storey, relationship_index, resume)
+
+    # Edge lists of Output02-05 for the readers that load Parquet
+    write_edge_parquets([
+        "Output02_RoomToRoom_ByDoors.csv", "Output03_RoomToRoom_ByWindows.csv",
+        "Output04_RoomBoundingWalls.csv", "Output05_Hosts_of_WindowsAndDoors.csv"
+    ], storey_name, building_name(ifc_file, storey_name))
@@ -0,0 +1,56 @@
+import os
+import numpy as np
+import ifcopenshell
+import ifcopenshell.geom
+import ifcopenshell.util.unit
+from topologicpy.Topology import Topology
+from topologicpy.Dictionary import Dictionary
+
+# --- Tessellation with the IfcOpenShell geometry iterator ---
+def geometry_settings():
+    settings = ifcopenshell.geom.settings()
+    # Project coordinates without openings, like the reconstruction from the profiles
+    settings.set(settings.USE_WORLD_COORDS, True)
+    settings.set(settings.DISABLE_OPENING_SUBTRACTIONS, True)
+    return settings
+
+def tessellate(elements, ifc_file, workers=None, scale=1.0):
+    # {GlobalId: (vertices (n, 3) float, triangles (m, 3) int)} for every representation type the iterator knows
+    # The iterator returns meters, scale converts them (e.g. back to project units)
+    meshes = {}
+    if not elements:
+        return meshes
+
+    iterator = ifcopenshell.geom.iterator(geometry_settings(), ifc_file, workers or os.cpu_count() or 1, include=list(elements))
+    if iterator.initialize():
+        while True:
+            shape = iterator.get()
+            vertices = np.array(shape.geometry.verts, dtype=float).reshape(-1, 3) * scale
+            triangles = np.array(shape.geometry.faces, dtype=np.int64).reshape(-1, 3)
+            meshes[shape.guid] = (vertices, triangles)
+            if not iterator.next():
+                break
+
+    missing = len(elements) - len(meshes)
+    if missing:
+        print(f"Geometry iterator produced no mesh for {missing} of {len(elements)} elements")
+    return meshes
+
+def project_unit_scale(ifc_file):
+    # Factor from meters to the length unit of the project (1000 for millimeters)
+    return 1.0 / ifcopenshell.util.unit.calculate_unit_scale(ifc_file)
+
+# --- Meshes as topologies ---
+def mesh_to_topology(vertices, triangles, material=None):
+    # Closed triangle mesh -> cell, coplanar triangles are joined again so neighbours can share whole faces
+    topology = Topology.ByGeometry(vertices=vertices.tolist(), faces=triangles.tolist(), outputMode="cell")
+    if topology is None:
+        return None
+    topology = Topology.RemoveCoplanarFaces(topology)
+    if material is not None:
+        topology = Topology.AddDictionary(topology, Dictionary.ByKeyValue("material", material))
+    return topology
+
+def mesh_bounding_box(vertices):
+    # Same form as topology_bounding_box, straight from the vertex buffer
+    return tuple(vertices.min(axis=0)) + tuple(vertices.max(axis=0))
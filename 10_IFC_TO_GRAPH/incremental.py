@@ -0,0 +1,139 @@
+import os
+import re
+import csv
+import json
+import hashlib
+import ifcopenshell.util.element
+
+# Manifests of the last run per step, next to the Output CSVs
+MANIFEST_DIR = ".incremental"
+
+# --- Fingerprints ---
+def entity_hash(entities):
+    # Attribute values without STEP ids, so a re-exported but unchanged element keeps its hash
+    sha = hashlib.sha256()
+    for entity in entities:
+        if entity is not None:
+            sha.update(repr(entity.get_info(include_identifier=False, recursive=True)).encode("utf-8"))
+    return sha.hexdigest()
+
+def geometry_fingerprint(element):
+    entities = [element.ObjectPlacement, element.Representation]
+    # Wall layers live in the shape aspects of the representation
+    if element.Representation and hasattr(element.Representation, "HasShapeAspects"):
+        entities.extend(element.Representation.HasShapeAspects)
+    return entity_hash(entities)
+
+def property_fingerprint(element):
+    container = ifcopenshell.util.element.get_container(element)
+    values = {
+        "name": element.Name,
+        "long_name": getattr(element, "LongName", None),
+        "object_type": getattr(element, "ObjectType", None),
+        "container": container.GlobalId if container else None,
+        "psets": ifcopenshell.util.element.get_psets(element)
+    }
+    return hashlib.sha256(repr(values).encode("utf-8")).hexdigest()
+
+def build_manifest(elements):
+    # Only the elements a step works on, an element entering the selection counts as added
+    manifest = {}
+    for element in elements:
+        manifest[element.GlobalId] = {
+            "type": element.is_a(),
+            "geometry": geometry_fingerprint(element),
+            "properties": property_fingerprint(element)
+        }
+    return manifest
+
+# --- Manifests ---
+def storey_step(step, ifc_file_path, storey_name):
+    # One manifest per IFC file and storey, so a run on another storey does not consume its changes.
+    # The file is keyed by its path, a hash of its content would change with every edit.
+    path_key = hashlib.sha256(os.path.abspath(ifc_file_path).encode("utf-8")).hexdigest()[:16]
+    storey_key = re.sub(r"[^\w.-]", "_", str(storey_name))
+    return f"{step}_{path_key}_{storey_key}"
+
+def manifest_path(step):
+    return os.path.join(MANIFEST_DIR, f"{step}.json")
+
+def load_manifest(step):
+    path = manifest_path(step)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_manifest(step, manifest):
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    temp_path = manifest_path(step) + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path(step))
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def save_output_digest(step, output_file):
+    # Output CSV written together with the manifest of step, a later run only patches this exact file
+    save_manifest(f"{step}_output", {"sha256": file_digest(output_file)})
+
+def output_unchanged(step, output_file):
+    # False if another storey or a full run wrote the Output CSV since, its rows do not belong to the manifest
+    stamp = load_manifest(f"{step}_output")
+    return stamp is not None and os.path.exists(output_file) and stamp["sha256"] == file_digest(output_file)
+
+def diff_manifests(previous, current):
+    changes = {"added": set(), "removed": set(), "geometry": set(), "properties": set()}
+    for guid, entry in current.items():
+        if guid not in previous:
+            changes["added"].add(guid)
+            continue
+        if entry["geometry"] != previous[guid]["geometry"]:
+            changes["geometry"].add(guid)
+        if entry["properties"] != previous[guid]["properties"]:
+            changes["properties"].add(guid)
+    changes["removed"] = set(previous) - set(current)
+    return changes
+
+def print_changes(changes):
+    print(f"Changes since last run: {len(changes['added'])} added, {len(changes['removed'])} removed, "
+          f"{len(changes['geometry'])} geometry, {len(changes['properties'])} properties")
+
+# --- Patching adjacency CSVs ---
+def dirty_pairs(pairs, keys, dirty):
+    # Only pairs with a new or moved element can change their result
+    return [(i, j) for i, j in pairs if keys[i] in dirty or keys[j] in dirty]
+
+def read_adjacency_csv(csv_file):
+    adjacency = {}
+    if not os.path.exists(csv_file):
+        return adjacency
+    with open(csv_file, "r", newline="") as file:
+        for row in csv.reader(file, delimiter=";"):
+            if row:
+                adjacency[row[0]] = [guid for guid in row[1].split(",") if guid] if len(row) > 1 else []
+    return adjacency
+
+def patch_adjacency(previous, keys, checked, dirty):
+    # Keep old contacts between unchanged elements, take everything that involves a dirty one from checked
+    key_set = set(keys)
+    touching = {key: set() for key in keys}
+    for key, partners in previous.items():
+        if key in key_set and key not in dirty:
+            for partner in partners:
+                if partner in key_set and partner not in dirty:
+                    touching[key].add(partner)
+
+    for key, partners in checked.items():
+        for partner in partners:
+            touching[key].add(partner)
+            touching[partner].add(key)
+
+    # Same ordering as a full run: rows by key order, partners by key order
+    order = {key: index for index, key in enumerate(keys)}
+    return {key: sorted(touching[key], key=order.get) for key in keys if touching[key]}
@@ -1,8 +1,24 @@
 from neo4j import GraphDatabase
 import csv
 import re
-
-def create_ifcspace_nodes(driver, spaces, storey_name):
+from edge_table import adjacency_rows
+
+# --- GlobalId lookups ---
+def guid_index(entities):
+    # First entity wins on duplicate GlobalIds, like the former next(...) scans
+    index = {}
+    for entity in entities:
+        index.setdefault(entity.GlobalId, entity)
+    return index
+
+def entity_lookup(ifc_file, ifc_type, lookups):
+    # {GlobalId: entity} of an IFC type, built on first use in the lookups dict of the caller
+    # The dict lives only as long as the processing function, so no parsed file is kept alive by this module
+    if ifc_type not in lookups:
+        lookups[ifc_type] = guid_index(ifc_file.by_type(ifc_type))
+    return lookups[ifc_type]
+
+def create_ifcspace_nodes(driver, spaces, storey_name, writer=None):
     with driver.session() as session:
         for space in spaces:
             global_id = space.GlobalId
@@ -16,9 +32,15 @@ def create_ifcspace_nodes(driver, spaces, storey_name):
                     level = rel.RelatingObject.Name
                     break
             
-            session.write_transaction(
-                add_space_node, global_id, space.id(), long_name, height, gross_floor_area, gross_volume, net_floor_area, level
-            )
+            if writer:
+                writer.add_node("Room", {
+                    "global_id": global_id, "oid": space.id(), "long_name": long_name, "height": height,
+                    "gross_floor_area": gross_floor_area, "gross_volume": gross_volume, "net_floor_area": net_floor_area, "level": level
+                })
+            else:
+                session.write_transaction(
+                    add_space_node, global_id, space.id(), long_name, height, gross_floor_area, gross_volume, net_floor_area, level
+                )
 
 def add_space_node(tx, global_id, oid, long_name, height, gross_floor_area, gross_volume, net_floor_area, level):
     tx.run(
@@ -42,7 +64,12 @@ def add_space_node(tx, global_id, oid, long_name, height, gross_floor_area, gros
         level=level
     )
 
-def process_doors_and_windows(driver, ifc_file, csv_file, element_type, element_label, storey_name):
+def process_doors_and_windows(driver, ifc_file, csv_file, element_type, element_label, storey_name, writer=None):
+    elements_by_guid = guid_index(ifc_file.by_type(element_type))
+    type_objects_by_element = type_object_lookup(ifc_file)
+    # Many instances share one type, so its property sets are read only once
+    type_properties_cache = {}
+
     with driver.session() as session:
         with open(csv_file, 'r') as file:
             for line in file:
@@ -50,7 +77,7 @@ def process_doors_and_windows(driver, ifc_file, csv_file, element_type, element_
                 element_global_id = parts[0]
                 connected_rooms_global_ids = parts[1].split(',') if len(parts) > 1 else []
 
-                element = next((e for e in ifc_file.by_type(element_type) if e.GlobalId == element_global_id), None)
+                element = elements_by_guid.get(element_global_id)
                 
                 if element:
                     element_oid = element.id()
@@ -77,29 +104,15 @@ def process_doors_and_windows(driver, ifc_file, csv_file, element_type, element_
                     element_type_value = None
 
                     # Durchsuche die zugeordneten Typen für weitere Eigenschaften
-                    for rel_def in ifc_file.by_type("IfcRelDefinesByType"):
-                        if element in rel_def.RelatedObjects:
-                            element_type_obj = rel_def.RelatingType
-
-                            for prop_set in element_type_obj.HasPropertySets:
-                                if prop_set.is_a("IfcPropertySet"):
-                                    for prop in prop_set.HasProperties:
-                                        if prop.is_a("IfcPropertySingleValue"):
-                                            value = getattr(prop.NominalValue, 'wrappedValue', None)
-                                            if prop.Name == "Material Panel":
-                                                material_panel = str(value) if value else None
-                                            elif prop.Name == "Material Frame":
-                                                material_frame = str(value) if value else None
-                                            elif prop.Name == "OperationType":
-                                                operation_type = str(value) if value else None
-                                            elif prop.Name == "Construction Type":
-                                                construction_type = str(value) if value else None
-                                            elif prop.Name == "Function":
-                                                is_external = str(value).lower() == 'exterior' if value else None
-                                            elif prop.Name == "Type Mark":
-                                                type_mark = str(value) if value else None
-                                            elif prop.Name == "Type":
-                                                element_type_value = str(value) if value else None
+                    for element_type_obj in type_objects_by_element.get(element.id(), []):
+                        type_properties = type_object_properties(element_type_obj, type_properties_cache)
+                        material_panel = type_properties.get("material_panel", material_panel)
+                        material_frame = type_properties.get("material_frame", material_frame)
+                        operation_type = type_properties.get("operation_type", operation_type)
+                        construction_type = type_properties.get("construction_type", construction_type)
+                        is_external = type_properties.get("is_external", is_external)
+                        type_mark = type_properties.get("type_mark", type_mark)
+                        element_type_value = type_properties.get("element_type_value", element_type_value)
 
                     # Überprüfung auf `Type` und andere Attribute in anderen Assoziationen
                     if not element_type_value or not is_external:
@@ -115,34 +128,44 @@ def process_doors_and_windows(driver, ifc_file, csv_file, element_type, element_
                                             elif prop.Name == "Type" and not element_type_value:
                                                 element_type_value = str(value) if value else None
 
-                    session.write_transaction(
-                        add_element_node, element_label, element_global_id, element_oid, name, height, width, area, sill_height, is_external, level, material_panel, material_frame, operation_type, construction_type, type_mark, element_type_value
-                    )
-
-                    for room_global_id in connected_rooms_global_ids:
+                    if writer:
+                        writer.add_node(element_label, {
+                            "global_id": element_global_id, "oid": str(element_oid), "name": name, "height": height, "width": width,
+                            "area": area, "sill_height": sill_height, "is_external": is_external, "level": level,
+                            "material_panel": material_panel, "material_frame": material_frame, "operation_type": operation_type,
+                            "construction_type": construction_type, "type_mark": type_mark, "element_type_value": element_type_value
+                        })
+                        for room_global_id in connected_rooms_global_ids:
+                            writer.add_edge(element_global_id, room_global_id, "ContainedIn", element_label, "Room")
+                    else:
                         session.write_transaction(
-                            add_edge, element_global_id, room_global_id, "ContainedIn"
+                            add_element_node, element_label, element_global_id, element_oid, name, height, width, area, sill_height, is_external, level, material_panel, material_frame, operation_type, construction_type, type_mark, element_type_value
                         )
 
+                        for room_global_id in connected_rooms_global_ids:
+                            session.write_transaction(
+                                add_edge, element_global_id, room_global_id, "ContainedIn", element_label, "Room"
+                            )
+
 def add_element_node(tx, element_label, global_id, oid, name, height, width, area, sill_height, is_external, level, material_panel, material_frame, operation_type, construction_type, type_mark, element_type_value):
     if element_label == "Window":
         tx.run(
             """
             MERGE (n:Window {GlobalId: $global_id})
-            ON CREATE SET n.OID = $oid,
-                          n.Name = $name,
-                          n.Height = $height,
-                          n.Width = $width,
-                          n.Area = $area,
-                          n.SillHeight = $sill_height,
-                          n.IsExternal = $is_external,
-                          n.Level = $level,
-                          n.MaterialPanel = $material_panel,
-                          n.MaterialFrame = $material_frame,
-                          n.OperationType = $operation_type,
-                          n.ConstructionType = $construction_type,
-                          n.TypeMark = $type_mark,
-                          n.Type = $element_type_value
+            SET n.OID = $oid,
+                n.Name = $name,
+                n.Height = $height,
+                n.Width = $width,
+                n.Area = $area,
+                n.SillHeight = $sill_height,
+                n.IsExternal = $is_external,
+                n.Level = $level,
+                n.MaterialPanel = $material_panel,
+                n.MaterialFrame = $material_frame,
+                n.OperationType = $operation_type,
+                n.ConstructionType = $construction_type,
+                n.TypeMark = $type_mark,
+                n.Type = $element_type_value
             """,
             global_id=global_id,
             oid=str(oid),  # Ensure oid is string
@@ -164,19 +187,19 @@ def add_element_node(tx, element_label, global_id, oid, name, height, width, are
         tx.run(
             """
             MERGE (n:Door {GlobalId: $global_id})
-            ON CREATE SET n.OID = $oid,
-                          n.Name = $name,
-                          n.Height = $height,
-                          n.Width = $width,
-                          n.Area = $area,
-                          n.IsExternal = $is_external,
-                          n.Level = $level,
-                          n.MaterialPanel = $material_panel,
-                          n.MaterialFrame = $material_frame,
-                          n.OperationType = $operation_type,
-                          n.ConstructionType = $construction_type,
-                          n.TypeMark = $type_mark,
-                          n.Type = $element_type_value
+            SET n.OID = $oid,
+                n.Name = $name,
+                n.Height = $height,
+                n.Width = $width,
+                n.Area = $area,
+                n.IsExternal = $is_external,
+                n.Level = $level,
+                n.MaterialPanel = $material_panel,
+                n.MaterialFrame = $material_frame,
+                n.OperationType = $operation_type,
+                n.ConstructionType = $construction_type,
+                n.TypeMark = $type_mark,
+                n.Type = $element_type_value
             """,
             global_id=global_id,
             oid=str(oid),  # Ensure oid is string
@@ -211,7 +234,7 @@ def extract_property_value(ifc_element, property_name, value_type):
                             return prop.NominalValue.wrappedValue
     return None
 
-def process_walls(driver, ifc_file, storey_name):
+def process_walls(driver, ifc_file, storey_name, writer=None):
     with driver.session() as session:
         walls = ifc_file.by_type("IfcWall")
         for wall in walls:
@@ -226,21 +249,27 @@ def process_walls(driver, ifc_file, storey_name):
                 height = extract_property_value(wall, 'Height', 'number')
                 length = extract_property_value(wall, 'Length', 'number')
 
-                session.write_transaction(
-                    add_wall_node, wall_global_id, wall_oid, name, is_external, load_bearing, height, length, width
-                )
+                if writer:
+                    writer.add_node("Wall", {
+                        "global_id": wall_global_id, "oid": wall_oid, "name": name, "is_external": is_external,
+                        "load_bearing": load_bearing, "height": height, "length": length, "width": width
+                    })
+                else:
+                    session.write_transaction(
+                        add_wall_node, wall_global_id, wall_oid, name, is_external, load_bearing, height, length, width
+                    )
 
 def add_wall_node(tx, global_id, oid, name, is_external, load_bearing, height, length, width):
     tx.run(
         """
         MERGE (n:Wall {GlobalId: $global_id})
-        ON CREATE SET n.OID = $oid,
-                      n.Name = $name,
-                      n.IsExternal = $is_external,
-                      n.LoadBearing = $load_bearing,
-                      n.Height = $height,
-                      n.Length = $length,
-                      n.Width = $width
+        SET n.OID = $oid,
+            n.Name = $name,
+            n.IsExternal = $is_external,
+            n.LoadBearing = $load_bearing,
+            n.Height = $height,
+            n.Length = $length,
+            n.Width = $width
         """,
         global_id=global_id,
         oid=oid,
@@ -252,37 +281,69 @@ def add_wall_node(tx, global_id, oid, name, is_external, load_bearing, height, l
         width=width
     )
 
-def process_walls_and_rooms(driver, csv_file, all_walls):
+def type_object_lookup(ifc_file):
+    # {element id: [type objects]} in file order, from one pass over IfcRelDefinesByType
+    type_objects = {}
+    for rel_def in ifc_file.by_type("IfcRelDefinesByType"):
+        for related_object in rel_def.RelatedObjects:
+            type_objects.setdefault(related_object.id(), []).append(rel_def.RelatingType)
+    return type_objects
+
+def type_object_properties(element_type_obj, cache):
+    # Flattened door/window properties of a type object, later properties overwrite earlier ones
+    if element_type_obj.id() in cache:
+        return cache[element_type_obj.id()]
+
+    # Only properties the type defines, so a second type object keeps the values of the first
+    properties = {}
+    for prop_set in element_type_obj.HasPropertySets or []:
+        if prop_set.is_a("IfcPropertySet"):
+            for prop in prop_set.HasProperties:
+                if prop.is_a("IfcPropertySingleValue"):
+                    value = getattr(prop.NominalValue, 'wrappedValue', None)
+                    if prop.Name == "Material Panel":
+                        properties["material_panel"] = str(value) if value else None
+                    elif prop.Name == "Material Frame":
+                        properties["material_frame"] = str(value) if value else None
+                    elif prop.Name == "OperationType":
+                        properties["operation_type"] = str(value) if value else None
+                    elif prop.Name == "Construction Type":
+                        properties["construction_type"] = str(value) if value else None
+                    elif prop.Name == "Function":
+                        properties["is_external"] = str(value).lower() == 'exterior' if value else None
+                    elif prop.Name == "Type Mark":
+                        properties["type_mark"] = str(value) if value else None
+                    elif prop.Name == "Type":
+                        properties["element_type_value"] = str(value) if value else None
+
+    cache[element_type_obj.id()] = properties
+    return properties
+
+def process_walls_and_rooms(driver, csv_file, all_walls, writer=None):
+    walls_by_guid = guid_index(all_walls)
+
     with driver.session() as session:
-        with open(csv_file, 'r') as file:
-            reader = csv.reader(file, delimiter=';')
-            for row in reader:
-                space_global_id = row[0]
-                wall_guids = row[1].split(',')
-                for wall_guid in wall_guids:
-                    wall_oid = next((wall.id() for wall in all_walls if wall.GlobalId == wall_guid), None)
-                    if wall_oid:
-                        session.write_transaction(
-                            add_edge, wall_guid, space_global_id, "ContainedIn"
-                        )
+        # Edge list from Parquet if the step wrote one, the CSV rows otherwise
+        for space_global_id, wall_guids in adjacency_rows(csv_file):
+            for wall_guid in wall_guids:
+                if wall_guid in walls_by_guid:
+                    write_edge(session, writer, wall_guid, space_global_id, "ContainedIn", "Wall", "Room")
+
+def process_wall_adjacency(driver, csv_file, all_walls, writer=None):
+    walls_by_guid = guid_index(all_walls)
 
-def process_wall_adjacency(driver, csv_file, all_walls):
     with driver.session() as session:
-        with open(csv_file, 'r') as file:
-            reader = csv.reader(file, delimiter=';')
-            for row in reader:
-                primary_wall_guid = row[0]
-                connected_wall_guids = row[1].split(',')
-                primary_wall_oid = next((wall.id() for wall in all_walls if wall.GlobalId == primary_wall_guid), None)
-                if primary_wall_oid:
-                    for connected_wall_guid in connected_wall_guids:
-                        connected_wall_oid = next((wall.id() for wall in all_walls if wall.GlobalId == connected_wall_guid), None)
-                        if connected_wall_oid:
-                            session.write_transaction(
-                                add_edge, primary_wall_guid, connected_wall_guid, "IsConnected"
-                            )
+        for primary_wall_guid, connected_wall_guids in adjacency_rows(csv_file):
+            if primary_wall_guid in walls_by_guid:
+                for connected_wall_guid in connected_wall_guids:
+                    if connected_wall_guid in walls_by_guid:
+                        write_edge(session, writer, primary_wall_guid, connected_wall_guid, "IsConnected", "Wall", "Wall")
+
+def process_element_hosts(driver, ifc_file, csv_file, all_walls, writer=None):
+    walls_by_guid = guid_index(all_walls)
+    # Doors and windows by GlobalId, one lookup per element type of the CSV
+    elements_by_type = {}
 
-def process_element_hosts(driver, ifc_file, csv_file, all_walls):
     with driver.session() as session:
         with open(csv_file, 'r') as file:
             reader = csv.reader(file, delimiter=';')
@@ -291,70 +352,235 @@ def process_element_hosts(driver, ifc_file, csv_file, all_walls):
                 element_guid = row[1]
                 wall_guid = row[2]
 
-                element_oid = next((e.id() for e in ifc_file.by_type(element_type) if e.GlobalId == element_guid), None)
-                wall_oid = next((wall.id() for wall in all_walls if wall.GlobalId == wall_guid), None)
-                if element_oid and wall_oid:
-                    session.write_transaction(
-                        add_edge, element_guid, wall_guid, "HostedBy"
-                    )
+                if element_guid in entity_lookup(ifc_file, element_type, elements_by_type) and wall_guid in walls_by_guid:
+                    write_edge(session, writer, element_guid, wall_guid, "HostedBy", element_type[3:], "Wall")
 
-def process_direct_connections(driver, csv_file):
+def process_direct_connections(driver, csv_file, writer=None):
     with driver.session() as session:
-        with open(csv_file, 'r') as file:
-            for line in file:
-                parts = line.strip().split(';')
-                main_room_global_id = parts[0]
-                if len(parts) > 1:
-                    connected_rooms_global_ids = parts[1].split(',')
-                    for neighbor_global_id in connected_rooms_global_ids:
-                        if main_room_global_id != neighbor_global_id:
-                            room_pair = sorted([main_room_global_id, neighbor_global_id])  # Sort IDs
-                            session.write_transaction(
-                                add_edge, room_pair[0], room_pair[1], "Direct"
-                            )
+        for main_room_global_id, connected_rooms_global_ids in adjacency_rows(csv_file):
+            for neighbor_global_id in connected_rooms_global_ids:
+                if main_room_global_id != neighbor_global_id:
+                    room_pair = sorted([main_room_global_id, neighbor_global_id])  # Sort IDs
+                    write_edge(session, writer, room_pair[0], room_pair[1], "Direct", "Room", "Room")
 
-def process_element_connections(driver, csv_file, access_type):
+def process_element_connections(driver, csv_file, access_type, writer=None):
     with driver.session() as session:
-        with open(csv_file, 'r') as file:
-            for line in file:
-                parts = line.strip().split(';')
-                element_global_id = parts[0]
-                if len(parts) > 1:
-                    connected_rooms_global_ids = parts[1].split(',')
-                    for i in range(len(connected_rooms_global_ids) - 1):
-                        for j in range(i + 1, len(connected_rooms_global_ids)):
-                            if connected_rooms_global_ids[i] != connected_rooms_global_ids[j]:
-                                room_pair = sorted([connected_rooms_global_ids[i], connected_rooms_global_ids[j]])  # Sort IDs
-                                session.write_transaction(
-                                    add_edge, room_pair[0], room_pair[1], access_type
-                                )
-
-def add_edge(tx, room1_global_id, room2_global_id, category):
-    sorted_ids = sorted([room1_global_id, room2_global_id])
+        for element_global_id, connected_rooms_global_ids in adjacency_rows(csv_file):
+            for i in range(len(connected_rooms_global_ids) - 1):
+                for j in range(i + 1, len(connected_rooms_global_ids)):
+                    if connected_rooms_global_ids[i] != connected_rooms_global_ids[j]:
+                        room_pair = sorted([connected_rooms_global_ids[i], connected_rooms_global_ids[j]])  # Sort IDs
+                        write_edge(session, writer, room_pair[0], room_pair[1], access_type, "Room", "Room")
+
+def sorted_endpoints(global_id_1, global_id_2, label_1=None, label_2=None):
+    # Edges point from the smaller to the larger GlobalId, labels travel with their id
+    return sorted([(global_id_1, label_1), (global_id_2, label_2)], key=lambda endpoint: endpoint[0])
+
+def node_pattern(variable, label, parameter):
+    # Labelled patterns let Neo4j use the GlobalId constraint instead of scanning all nodes
+    if label:
+        return f"({variable}:{label} {{GlobalId: {parameter}}})"
+    return f"({variable} {{GlobalId: {parameter}}})"
+
+def add_edge(tx, room1_global_id, room2_global_id, category, label1=None, label2=None):
+    (id_a, label_a), (id_b, label_b) = sorted_endpoints(room1_global_id, room2_global_id, label1, label2)
     label = "Access" if category in ["Direct", "Door", "Window"] else category
     access_type = category if category in ["Direct", "Door", "Window"] else None
 
     if access_type:
         tx.run(
             f"""
-            MATCH (a {{GlobalId: $room1_global_id}}), (b {{GlobalId: $room2_global_id}})
+            MATCH {node_pattern("a", label_a, "$room1_global_id")}, {node_pattern("b", label_b, "$room2_global_id")}
             MERGE (a)-[r:{label}]->(b)
             ON CREATE SET r.AccessType = $access_type
             """,
-            room1_global_id=sorted_ids[0],
-            room2_global_id=sorted_ids[1],
+            room1_global_id=id_a,
+            room2_global_id=id_b,
             access_type=access_type
         )
     else:
         tx.run(
             f"""
-            MATCH (a {{GlobalId: $room1_global_id}}), (b {{GlobalId: $room2_global_id}})
+            MATCH {node_pattern("a", label_a, "$room1_global_id")}, {node_pattern("b", label_b, "$room2_global_id")}
             MERGE (a)-[r:{label}]->(b)
             """,
-            room1_global_id=sorted_ids[0],
-            room2_global_id=sorted_ids[1]
+            room1_global_id=id_a,
+            room2_global_id=id_b
         )
 
+def write_edge(session, writer, global_id_1, global_id_2, category, label1=None, label2=None):
+    # Buffer the edge in the batch writer if there is one, otherwise write it directly
+    if writer:
+        writer.add_edge(global_id_1, global_id_2, category, label1, label2)
+    else:
+        session.write_transaction(add_edge, global_id_1, global_id_2, category, label1, label2)
+
+# --- Schema setup ---
+# Key property of every node label written by the pipeline
+NODE_KEYS = {
+    "Room": "GlobalId",
+    "Door": "GlobalId",
+    "Window": "GlobalId",
+    "Wall": "GlobalId",
+    "Furniture": "GlobalId",
+    "Material": "unique_id"
+}
+
+def ensure_schema(driver):
+    # Uniqueness constraints (and with them an index) on the node keys, safe to run on every build
+    with driver.session() as session:
+        for label, key in NODE_KEYS.items():
+            try:
+                session.run(
+                    f"CREATE CONSTRAINT {label.lower()}_{key.lower()} IF NOT EXISTS FOR (n:{label}) REQUIRE n.{key} IS UNIQUE"
+                ).consume()
+            except Exception as e:
+                # Existing duplicates prevent the constraint, a plain index still turns MATCH into a seek
+                print(f"Could not create uniqueness constraint for {label}.{key}: {e}")
+                session.run(
+                    f"CREATE INDEX {label.lower()}_{key.lower()}_index IF NOT EXISTS FOR (n:{label}) ON (n.{key})"
+                ).consume()
+
+# --- Batched UNWIND writes ---
+# One statement per label, same MERGE semantics as the add_*_node functions
+NODE_QUERIES = {
+    "Room": """
+        UNWIND $rows AS row
+        MERGE (n:Room {GlobalId: row.global_id})
+        ON CREATE SET n.Object = 'Room', n.OID = row.oid
+        SET n.Name = row.long_name,
+            n.Height = row.height,
+            n.GrossFloorArea = row.gross_floor_area,
+            n.NetFloorArea = row.net_floor_area,
+            n.GrossVolume = row.gross_volume,
+            n.Level = row.level
+        """,
+    "Window": """
+        UNWIND $rows AS row
+        MERGE (n:Window {GlobalId: row.global_id})
+        SET n.OID = row.oid,
+            n.Name = row.name,
+            n.Height = row.height,
+            n.Width = row.width,
+            n.Area = row.area,
+            n.SillHeight = row.sill_height,
+            n.IsExternal = row.is_external,
+            n.Level = row.level,
+            n.MaterialPanel = row.material_panel,
+            n.MaterialFrame = row.material_frame,
+            n.OperationType = row.operation_type,
+            n.ConstructionType = row.construction_type,
+            n.TypeMark = row.type_mark,
+            n.Type = row.element_type_value
+        """,
+    "Door": """
+        UNWIND $rows AS row
+        MERGE (n:Door {GlobalId: row.global_id})
+        SET n.OID = row.oid,
+            n.Name = row.name,
+            n.Height = row.height,
+            n.Width = row.width,
+            n.Area = row.area,
+            n.IsExternal = row.is_external,
+            n.Level = row.level,
+            n.MaterialPanel = row.material_panel,
+            n.MaterialFrame = row.material_frame,
+            n.OperationType = row.operation_type,
+            n.ConstructionType = row.construction_type,
+            n.TypeMark = row.type_mark,
+            n.Type = row.element_type_value
+        """,
+    "Wall": """
+        UNWIND $rows AS row
+        MERGE (n:Wall {GlobalId: row.global_id})
+        SET n.OID = row.oid,
+            n.Name = row.name,
+            n.IsExternal = row.is_external,
+            n.LoadBearing = row.load_bearing,
+            n.Height = row.height,
+            n.Length = row.length,
+            n.Width = row.width
+        """,
+    "Furniture": """
+        UNWIND $rows AS row
+        MERGE (n:Furniture {GlobalId: row.global_id})
+        SET n.ObjectType = row.object_type,
+            n.Level = row.level
+        """
+}
+
+def edge_query(category, label_a=None, label_b=None):
+    # Same relationship label and AccessType rule as add_edge
+    label = "Access" if category in ["Direct", "Door", "Window"] else category
+    access_type = category if category in ["Direct", "Door", "Window"] else None
+
+    query = f"""
+        UNWIND $rows AS row
+        MATCH {node_pattern("a", label_a, "row.a")}, {node_pattern("b", label_b, "row.b")}
+        MERGE (a)-[r:{label}]->(b)
+        """
+    if access_type:
+        query += "ON CREATE SET r.AccessType = $access_type"
+    return query, access_type
+
+def write_rows(tx, query, rows, **params):
+    tx.run(query, rows=rows, **params)
+
+class BatchWriter:
+    # Buffers node rows per label and edge rows per category and writes them with UNWIND
+    def __init__(self, driver, batch_size=1000, only_guids=None):
+        self.driver = driver
+        self.batch_size = batch_size
+        # Incremental runs only write nodes in only_guids and edges touching one of them
+        self.only_guids = only_guids
+        self.node_rows = {}
+        self.edge_rows = {}
+        self.statements = 0
+
+    def add_node(self, label, row):
+        if self.only_guids is not None and row["global_id"] not in self.only_guids:
+            return
+        rows = self.node_rows.setdefault(label, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush_nodes(label)
+
+    def add_edge(self, global_id_1, global_id_2, category, label1=None, label2=None):
+        if self.only_guids is not None and global_id_1 not in self.only_guids and global_id_2 not in self.only_guids:
+            return
+        (id_a, label_a), (id_b, label_b) = sorted_endpoints(global_id_1, global_id_2, label1, label2)
+        # One statement per relationship category and endpoint labels
+        key = (category, label_a, label_b)
+        rows = self.edge_rows.setdefault(key, [])
+        rows.append({"a": id_a, "b": id_b})
+        if len(rows) >= self.batch_size:
+            # Edges MATCH their end nodes, so pending nodes go first
+            self.flush_nodes()
+            self.flush_edges(key)
+
+    def flush_nodes(self, label=None):
+        labels = [label] if label else list(self.node_rows.keys())
+        with self.driver.session() as session:
+            for node_label in labels:
+                rows = self.node_rows.pop(node_label, [])
+                for start in range(0, len(rows), self.batch_size):
+                    session.write_transaction(write_rows, NODE_QUERIES[node_label], rows[start:start + self.batch_size])
+                    self.statements += 1
+
+    def flush_edges(self, key=None):
+        keys = [key] if key else list(self.edge_rows.keys())
+        with self.driver.session() as session:
+            for edge_key in keys:
+                rows = self.edge_rows.pop(edge_key, [])
+                query, access_type = edge_query(*edge_key)
+                for start in range(0, len(rows), self.batch_size):
+                    session.write_transaction(write_rows, query, rows[start:start + self.batch_size], access_type=access_type)
+                    self.statements += 1
+
+    def flush(self):
+        self.flush_nodes()
+        self.flush_edges()
+
 # Funktion zum Dekodieren von Unicode-Sonderzeichen in IFC-TEXT
 def decode_ifc_text(text):
     matches = re.findall(r'\\X\\([0-9A-Fa-f]{4})', text)
@@ -386,7 +612,7 @@ def extract_quantities(element):
 
     return height, gross_floor_area, gross_volume, net_floor_area
 
-def process_furniture(driver, ifc_file, storey_name):
+def process_furniture(driver, ifc_file, storey_name, writer=None):
     # Definieren Sie die Schlüsselwörter für den Filter
     furniture_keywords = {
         "Bett": "ligg",
@@ -418,28 +644,79 @@ def process_furniture(driver, ifc_file, storey_name):
                                 break
 
                         # Node für Möbelstück erstellen
-                        session.write_transaction(
-                            add_furniture_node, furniture_global_id, object_type, level
-                        )
+                        if writer:
+                            writer.add_node("Furniture", {"global_id": furniture_global_id, "object_type": object_type, "level": level})
+                        else:
+                            session.write_transaction(
+                                add_furniture_node, furniture_global_id, object_type, level
+                            )
 
                         # Edge zwischen Möbelstück und Raum erstellen
-                        session.write_transaction(
-                            add_edge, furniture_global_id, space_global_id, "ContainedIn"
-                        )
+                        write_edge(session, writer, furniture_global_id, space_global_id, "ContainedIn", "Furniture", "Room")
                     # Wenn `ObjectType` nicht passt, wird der Node nicht erstellt.
 
 def add_furniture_node(tx, global_id, object_type, level):
     tx.run(
         """
         MERGE (n:Furniture {GlobalId: $global_id})
-        ON CREATE SET n.ObjectType = $object_type,
-                      n.Level = $level
+        SET n.ObjectType = $object_type,
+            n.Level = $level
         """,
         global_id=global_id,
         object_type=object_type,
         level=level
     )
 
+# --- Incremental updates ---
+# Relationship types written by 004, the ConsistsOf / IsFacing / InternallyConnected edges of 005A are kept
+GRAPH_RELATIONSHIPS = ["ContainedIn", "IsConnected", "HostedBy", "Access"]
+
+def delete_relationships(driver, global_ids):
+    # Changed elements keep their node (and the 005A edges), their 004 relationships are written again
+    with driver.session() as session:
+        result = session.run(
+            f"""
+            MATCH (n)-[r:{"|".join(GRAPH_RELATIONSHIPS)}]-()
+            WHERE (n:Room OR n:Door OR n:Window OR n:Wall OR n:Furniture) AND n.GlobalId IN $global_ids
+            DELETE r
+            """,
+            global_ids=list(global_ids)
+        )
+        return result.consume().counters.relationships_deleted
+
+def delete_nodes(driver, global_ids):
+    # Removed elements go with all their relationships, Material layers without wall are removed with them
+    with driver.session() as session:
+        for label in ["Room", "Door", "Window", "Wall", "Furniture"]:
+            session.run(
+                f"""
+                MATCH (n:{label})
+                WHERE n.GlobalId IN $global_ids
+                DETACH DELETE n
+                """,
+                global_ids=list(global_ids)
+            ).consume()
+        session.run(
+            """
+            MATCH (m:Material)
+            WHERE NOT (m)<-[:ConsistsOf]-(:Wall)
+            DETACH DELETE m
+            """
+        ).consume()
+
+def rooms_of_elements(driver, global_ids):
+    # Rooms a door / window was connected to in the graph of the last run
+    with driver.session() as session:
+        result = session.run(
+            """
+            MATCH (e)-[:ContainedIn]-(r:Room)
+            WHERE (e:Door OR e:Window) AND e.GlobalId IN $global_ids
+            RETURN DISTINCT r.GlobalId AS room_guid
+            """,
+            global_ids=list(global_ids)
+        )
+        return {record["room_guid"] for record in result}
+
 def cleanup_isolated_nodes(driver, level_name):
     with driver.session() as session:
         # Löschen von isolierten Wall-Nodes auf dem spezifischen Geschoss
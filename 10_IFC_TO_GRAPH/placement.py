@@ -0,0 +1,108 @@
+import numpy as np
+import ifcopenshell
+from topologicpy.Vertex import Vertex
+from topologicpy.Face import Face
+from topologicpy.Cell import Cell
+
+# --- 4x4 matrices of IFC placements ---
+def placement_matrix(location, axis=None, ref_direction=None):
+    # Columns: local X (RefDirection made orthogonal to Axis), local Y, local Z (Axis), origin
+    z_axis = np.array(axis if axis is not None else (0.0, 0.0, 1.0), dtype=float)
+    z_axis = z_axis / np.linalg.norm(z_axis)
+    x_axis = np.array(ref_direction if ref_direction is not None else (1.0, 0.0, 0.0), dtype=float)
+    x_axis = x_axis - np.dot(x_axis, z_axis) * z_axis
+    x_axis = x_axis / np.linalg.norm(x_axis)
+    y_axis = np.cross(z_axis, x_axis)
+
+    matrix = np.eye(4)
+    matrix[:3, 0] = x_axis
+    matrix[:3, 1] = y_axis
+    matrix[:3, 2] = z_axis
+    matrix[:len(location), 3] = location
+    return matrix
+
+def axis2placement_matrix(axis_placement):
+    # IfcAxis2Placement3D, Axis and RefDirection default to Z and X
+    axis = axis_placement.Axis.DirectionRatios if getattr(axis_placement, "Axis", None) else None
+    ref_direction = axis_placement.RefDirection.DirectionRatios if axis_placement.RefDirection else None
+    return placement_matrix(axis_placement.Location.Coordinates, axis, ref_direction)
+
+class PlacementResolver:
+    # World matrices of IfcLocalPlacement nodes by STEP id, one resolver per IFC file
+    def __init__(self):
+        self.matrices = {}
+
+    def world_matrix(self, local_placement):
+        # PlacementRelTo chain up to the first resolved parent (or the root), then resolved downwards
+        chain = []
+        node = local_placement
+        while node is not None and node.id() not in self.matrices:
+            if not node.is_a("IfcLocalPlacement"):
+                raise ValueError(f"Unsupported placement {node.is_a()} #{node.id()}")
+            if not isinstance(getattr(node.RelativePlacement, "Location", None), ifcopenshell.entity_instance):
+                raise ValueError(f"No valid IfcCartesianPoint in placement #{node.id()}")
+            chain.append(node)
+            node = node.PlacementRelTo
+
+        # Storey and building placements are shared, after the first element they are found here
+        matrix = self.matrices[node.id()] if node is not None else np.eye(4)
+        for node in reversed(chain):
+            matrix = matrix @ axis2placement_matrix(node.RelativePlacement)
+            self.matrices[node.id()] = matrix
+        return matrix
+
+    def object_matrix(self, product):
+        # ValueError for placements that cannot be resolved, callers skip that element
+        if product.ObjectPlacement is None:
+            return np.eye(4)
+        return self.world_matrix(product.ObjectPlacement)
+
+def scale_matrix(scale):
+    return np.diag([scale, scale, scale, 1.0])
+
+# --- Stacked transforms ---
+def homogeneous_points(points):
+    # 2D profile points are embedded in the XY plane
+    points = np.asarray(points, dtype=float).reshape(len(points), -1)
+    result = np.zeros((len(points), 4))
+    result[:, :points.shape[1]] = points
+    result[:, 3] = 1.0
+    return result
+
+def transform_profiles(matrices, profiles):
+    # All profiles in one product: every point is multiplied with the matrix of its profile
+    if not profiles:
+        return []
+    counts = [len(profile) for profile in profiles]
+    points = np.concatenate([homogeneous_points(profile) for profile in profiles])
+    owners = np.repeat(np.arange(len(profiles)), counts)
+    world = np.einsum("nij,nj->ni", np.asarray(matrices, dtype=float)[owners], points)[:, :3]
+    return np.split(world, np.cumsum(counts)[:-1])
+
+def transform_vectors(matrices, vectors):
+    # Directions only see the linear part (rotation and scale)
+    if not len(vectors):
+        return np.zeros((0, 3))
+    return np.einsum("nij,nj->ni", np.asarray(matrices, dtype=float)[:, :3, :3], np.asarray(vectors, dtype=float))
+
+def transform_points(matrix, points):
+    return transform_profiles([matrix], [points])[0]
+
+# --- Topology from world coordinates ---
+def thickened_cell(world_points, world_extrusion):
+    # Face on the transformed profile, thickened along the transformed extrusion vector
+    vertices = [Vertex.ByCoordinates(x, y, z) for x, y, z in world_points]
+    face = Face.ByVertices(vertices)
+    face_normal = np.array(Face.Normal(face))
+    face_normal = face_normal / np.linalg.norm(face_normal)
+    thickness = np.linalg.norm(world_extrusion)
+
+    # Reverse if the face normal points against the extrusion (threshold for floating-point precision)
+    reverse = np.dot(face_normal, world_extrusion / thickness) < -0.9999
+    return Cell.ByThickenedFace(face, thickness=thickness, bothSides=False, reverse=reverse)
+
+def face_set_cell(world_points, face_indices):
+    # IfcPolygonalFaceSet, indices are 1-based
+    vertices = [Vertex.ByCoordinates(x, y, z) for x, y, z in world_points]
+    faces = [Face.ByVertices([vertices[i - 1] for i in indices]) for indices in face_indices]
+    return Cell.ByFaces(faces)
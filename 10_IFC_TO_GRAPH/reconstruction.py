@@ -0,0 +1,302 @@
+import numpy as np
+import logging
+from topologicpy.Topology import Topology
+from topologicpy.Dictionary import Dictionary
+from extrusion_contact import extrusion_prism, DEFAULT_TOLERANCE
+from ifc_tessellation import tessellate, mesh_to_topology, project_unit_scale
+from placement import PlacementResolver, axis2placement_matrix, transform_profiles, transform_vectors, thickened_cell, face_set_cell
+
+# Geometry of spaces and wall layers as read by 001, 003, 005A and the find_adjacent modules
+
+# --- Spaces ---
+def read_space_profile(space, placements):
+    # Profile, extrusion and placements of the space's IfcExtrudedAreaSolid, None if there is none
+    profile_data = None
+
+    ### Gather Informations of Space
+
+    # World matrix of the space placement, including the storey / building placements it is relative to.
+    # Placements that cannot be resolved (e.g. IfcGridPlacement) skip this space, not the storey
+    try:
+        object_matrix = placements.object_matrix(space)
+    except ValueError as e:
+        print(f"Placement of Space {space.GlobalId} not supported: {e}")
+        return None
+    logging.debug("Object placement of IfcSpace: %s", object_matrix)
+
+    # Retrieve the product definition shape of the space (which contains geometric representations)
+    product_definition_shape = space.Representation
+    logging.debug("IFCPRODUCTDEFINITIONSHAPE found: %s", product_definition_shape)
+
+    if product_definition_shape:
+        # Iterate over the representations (e.g., Body, Footprint, etc.)
+        for representation in product_definition_shape.Representations:
+            if representation.is_a('IfcShapeRepresentation'):
+                logging.debug(f"Found Shape Representation: {representation.RepresentationType}")
+
+                # Iterate through items in the shape representation
+                for item in representation.Items:
+                    if item.is_a('IfcExtrudedAreaSolid'):
+                        # Get extrusion depth of the space
+                        space_extrusion_depth = item.Depth
+                        logging.debug(f"Extrusion Depth: {space_extrusion_depth}")
+
+                        # Position of the profile inside the space
+                        if item.Position.is_a('IfcAxis2Placement3D'):
+                            position_matrix = axis2placement_matrix(item.Position)
+                            logging.debug("Position of the extrusion: %s", position_matrix)
+                        else:
+                            logging.debug("No valid IFCAXIS2PLACEMENT3D found for space.")
+                            position_matrix = np.eye(4)
+
+                        # Get extrusion direction
+                        space_extruded_direction = np.array(item.ExtrudedDirection.DirectionRatios, dtype=float)
+                        logging.debug(f"Extruded Direction (IFCDIRECTION): {space_extruded_direction}")
+
+                        # Get the profile definition type and handle specific profile types
+                        profile = item.SweptArea
+                        profile_type = profile.is_a()
+                        logging.debug(f"Profile Type: {profile_type}")
+
+                        if profile_type == 'IfcArbitraryClosedProfileDef':
+                            # Retrieve points for the outer curve of the profile
+                            if hasattr(profile, 'OuterCurve') and profile.OuterCurve.is_a('IfcIndexedPolyCurve'):
+                                indexed_polycurve = profile.OuterCurve
+                                if hasattr(indexed_polycurve, 'Points') and indexed_polycurve.Points.is_a('IfcCartesianPointList2D'):
+                                    points = indexed_polycurve.Points.CoordList
+
+                                    logging.debug("----VERTICES----")
+                                    for point in points:
+                                        logging.debug(f"Point: {point}")
+
+                                    profile_data = {
+                                        "points": points,
+                                        "matrix": object_matrix @ position_matrix,
+                                        "extrusion": space_extruded_direction / np.linalg.norm(space_extruded_direction) * space_extrusion_depth
+                                    }
+                        else:
+                            logging.debug(f"Profile type {profile_type} not supported or not handled.")
+                    else:
+                        logging.debug("Item is not IFCEXTRUDEDAREASOLID")
+            else:
+                logging.debug("Representation is not an IfcShapeRepresentation")
+
+    return profile_data
+
+# --- Walls ---
+def extract_geometry_info_from_shape_aspect(shape_aspect):
+    coordinates_list = []
+    indices_list = []
+    voids_indices_list = []
+
+    # Überprüfen, ob die ShapeAspect eine IfcPolygonalFaceSet enthält
+    for representation in shape_aspect.ShapeRepresentations:
+        if representation.is_a('IfcShapeRepresentation'):
+            for item in representation.Items:
+                if item.is_a('IfcPolygonalFaceSet'):
+                    # IFCCARTESIANPOINTLIST3D (Koordinaten) extrahieren
+                    if hasattr(item, 'Coordinates'):
+                        coordinates = item.Coordinates.CoordList
+                        coordinates_list.extend(coordinates)
+                        print("  IFCCARTESIANPOINTLIST3D (Koordinaten):")
+                        for coord in coordinates:
+                            print(f"    - {coord}")
+
+                    # IFCINDEXEDPOLYGONALFACE (Flächen) und Voids extrahieren
+                    if hasattr(item, 'Faces'):
+                        faces = item.Faces
+                        print("  IFCINDEXEDPOLYGONALFACE (Flächen):")
+                        for face in faces:
+                            if face.is_a('IfcIndexedPolygonalFaceWithVoids'):
+                                indices_list.append(face.CoordIndex)
+                                voids_indices_list.extend(face.InnerCoordIndices)
+                                print(f"    - Outer: {face.CoordIndex}, Voids: {face.InnerCoordIndices}")
+                            else:
+                                indices_list.append(face.CoordIndex)
+                                print(f"    - {face.CoordIndex}")
+    return coordinates_list, indices_list, voids_indices_list
+
+def clean_indices_list(indices_list, voids_indices_list):
+    cleaned_indices_list = []
+
+    for indices in indices_list:
+        if not any(index in [void_index for void_tup in voids_indices_list for void_index in void_tup] for index in indices):
+            cleaned_indices_list.append(indices)
+
+    return cleaned_indices_list
+
+def read_wall_layers(wall, placements):
+    # Placement of the wall and profile / extrusion or face set of every layer, still in local coordinates
+
+    ### Gather Informations of Wall
+
+    # World matrix of the wall placement, including the storey / building placements it is relative to.
+    # Placements that cannot be resolved (e.g. IfcGridPlacement) skip this wall, not the storey
+    try:
+        wall_matrix = placements.object_matrix(wall)
+    except ValueError as e:
+        print(f"Placement of Wall {wall.GlobalId} not supported: {e}, skipped")
+        return None, []
+    print(f"Object Placement of IfcWall:\n{wall_matrix}")
+
+    ### Gather Informations of Layers
+
+    # Retrieve the product definition shape of wall (which contains geometric representations)
+    product_definition_shape = wall.Representation
+    print("IFCPRODUCTDEFINITIONSHAPE found:", product_definition_shape)
+
+    shape_aspects = []
+
+    # Check if the product definition shape has any shape aspects
+    if product_definition_shape and hasattr(product_definition_shape, 'HasShapeAspects'):
+        shape_aspects = product_definition_shape.HasShapeAspects
+        if shape_aspects:
+            print(f"Found {len(shape_aspects)} Shape Aspects")
+        else:
+            print("HasShapeAspects exists but is empty.")
+    else:
+        print("No IFCSHAPEASPECTs found or 'HasShapeAspects' does not exist.")
+
+    layers = []
+
+    for shape_aspect in shape_aspects:
+
+        ### Gather Informations of specific Layer
+
+        layer = {"material": shape_aspect.Name}
+
+        for representation in shape_aspect.ShapeRepresentations:
+            if representation.is_a('IFCSHAPEREPRESENTATION'):
+                # Iterate through items in the shape representation
+                for item in representation.Items:
+                    if item.is_a('IFCEXTRUDEDAREASOLID'):
+                        # Get extrusion depth of the layer
+                        layer_extrusion_depth = item.Depth
+
+                        # Position of the layer profile inside the wall
+                        if item.Position.is_a('IFCAXIS2PLACEMENT3D'):
+                            layer_matrix = axis2placement_matrix(item.Position)
+                        else:
+                            print("No valid IFCAXIS2PLACEMENT3D found.")
+                            layer_matrix = np.eye(4)
+
+                        # Get extrusion direction
+                        layer_extruded_direction = np.array(item.ExtrudedDirection.DirectionRatios, dtype=float)
+
+                        # Get the profile definition type and handle specific profile types
+                        profile = item.SweptArea
+                        layer_profile_type = profile.is_a()
+                        print(f"Profile Type: {layer_profile_type}")
+
+                        points = None
+                        if layer_profile_type in ['IfcArbitraryClosedProfileDef', 'IfcArbitraryProfileDefWithVoids']:
+                            # Retrieve points for the outer curve of the profile
+                            # For IfcArbitraryProfileDefWithVoids "InnerCurve" is neglected because, our Goal can be achieved without these Openings
+                            if hasattr(profile, 'OuterCurve') and profile.OuterCurve.is_a('IFCINDEXEDPOLYCURVE'):
+                                indexed_polycurve = profile.OuterCurve
+                                if hasattr(indexed_polycurve, 'Points') and indexed_polycurve.Points.is_a('IFCCARTESIANPOINTLIST2D'):
+                                    points = indexed_polycurve.Points.CoordList
+                            else:
+                                print(f"No valid OuterCurve or Points found for {layer_profile_type}")
+                        else:
+                            print("Profile definition is neither IfcArbitraryClosedProfileDef nor IfcArbitraryProfileDefWithVoids")
+
+                        if points is not None:
+                            layer["points"] = points
+                            layer["matrix"] = layer_matrix
+                            layer["extrusion"] = layer_extruded_direction / np.linalg.norm(layer_extruded_direction) * layer_extrusion_depth
+                            layer["faces"] = None
+
+                    elif item.is_a('IFCPOLYGONALFACESET'):
+                        # IFCPOLYGONALFACESET: Koordinaten liegen bereits im System der Wand
+                        coordinates_list, indices_list, voids_indices_list = extract_geometry_info_from_shape_aspect(shape_aspect)
+                        layer["points"] = coordinates_list
+                        layer["matrix"] = np.eye(4)
+                        layer["extrusion"] = None
+                        layer["faces"] = clean_indices_list(indices_list, voids_indices_list)
+
+                    else:
+                        print("Unknown Representation")
+            else:
+                print("Shape aspect does not have correct IFCSHAPEREPRESENTATION")
+
+        if "points" in layer:
+            layers.append(layer)
+        else:
+            print(f"No geometry found for layer {layer['material']}")
+
+    return wall_matrix, layers
+
+def reconstruct_walls(ifc_file, wall_guids, placements=None, welder=None):
+    # Layer cells in project coordinates (with material dictionary) and their prisms, per wall GUID
+    # welder: VertexWelder of the storey in project units, snaps the layers before the cells are built
+    if placements is None:
+        placements = PlacementResolver()
+    # Prism tolerance is given in meters, the layers are in project units
+    contact_tolerance = DEFAULT_TOLERANCE * project_unit_scale(ifc_file)
+
+    layers = []
+    for wall_guid in wall_guids:
+        print("Reading layers of Wall:", wall_guid)
+        wall_matrix, wall_layers = read_wall_layers(ifc_file.by_guid(wall_guid), placements)
+        for layer in wall_layers:
+            layers.append((wall_guid, wall_matrix @ layer["matrix"], layer))
+
+    ### Transformation from local CoordSystem to ProjectCoordSystem, all layers of the storey in one product
+
+    matrices = [matrix for _, matrix, _ in layers]
+    world_profiles = transform_profiles(matrices, [layer["points"] for _, _, layer in layers])
+    extrusions = [layer["extrusion"] if layer["extrusion"] is not None else np.zeros(3) for _, _, layer in layers]
+    world_extrusions = transform_vectors(matrices, extrusions)
+
+    ### Build Topology
+
+    walls = {wall_guid: ([], []) for wall_guid in wall_guids}
+    for (wall_guid, _, layer), world_points, world_extrusion in zip(layers, world_profiles, world_extrusions):
+        faces = layer["faces"]
+        if welder is not None:
+            if faces is None:
+                world_points = welder.weld_profile(world_points)
+                world_extrusion = welder.snap_vector(world_extrusion)
+                if world_points is None:
+                    print(f"Layer {layer['material']} of Wall {wall_guid} collapsed on the snap grid, skipped")
+                    continue
+            else:
+                world_points, faces = welder.weld_faces(world_points, faces)
+
+        if faces is None:
+            cell = thickened_cell(world_points, world_extrusion)
+            # Profile and Z range of the layer for the analytic contact test
+            prism = extrusion_prism(world_points, world_extrusion, tolerance=contact_tolerance)
+        else:
+            # IfcPolygonalFaceSet layers have no prism
+            cell = face_set_cell(world_points, faces)
+            prism = None
+
+        # Output to confirm that the cell has been created
+        print("Cell created:", cell)
+
+        Topology.AddDictionary(cell,Dictionary.ByKeyValue("material",layer["material"]))
+
+        cells, prisms = walls[wall_guid]
+        cells.append(cell)
+        prisms.append(prism)
+
+    return walls
+
+def tessellate_walls(ifc_file, wall_guids, welder=None):
+    # One cell per wall from the geometry iterator in project units, any representation type but no separate layers
+    meshes = tessellate([ifc_file.by_guid(wall_guid) for wall_guid in wall_guids], ifc_file, scale=project_unit_scale(ifc_file))
+    if welder is not None:
+        meshes = {wall_guid: welder.weld_mesh(*mesh) for wall_guid, mesh in meshes.items()}
+
+    walls = {}
+    for wall_guid in wall_guids:
+        cell = mesh_to_topology(*meshes[wall_guid]) if wall_guid in meshes else None
+        if cell is None:
+            print(f"No closed mesh for Wall {wall_guid}")
+            walls[wall_guid] = ([], [])
+        else:
+            # No prism, the extrusion engine falls back to Topology.Merge for these walls
+            walls[wall_guid] = ([cell], [None])
+    return walls
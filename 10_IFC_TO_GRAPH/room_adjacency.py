@@ -0,0 +1,320 @@
+import logging
+import argparse
+from adjacency_functions import (
+    cells_share_face,
+    topology_bounding_box,
+    candidate_pairs,
+    mirror_adjacency,
+    PairPool,
+    run_pair_checks,
+    storey_self_merge_pairs,
+)
+from extrusion_contact import extrusion_prism, extrusion_pair_checks
+from tiling import plan_tiles, run_tiled, room_tile
+from snapping import VertexWelder
+from ifc_tessellation import tessellate, mesh_to_topology, mesh_bounding_box
+from placement import PlacementResolver, scale_matrix, transform_profiles, transform_vectors, thickened_cell
+from reconstruction import read_space_profile
+from csv_output import StreamingCSVWriter
+from checkpoint import run_signature, checkpointed_pairs
+from edge_table import write_edge_parquet, building_name
+from geometry_cache import GeometryCache, topology_to_entry, topology_from_entry, entry_points
+from incremental import storey_step, build_manifest, load_manifest, save_manifest, save_output_digest, output_unchanged, diff_manifests, print_changes, dirty_pairs, read_adjacency_csv, patch_adjacency
+
+# Face checks of --engine
+ROOM_ENGINES = ["merge", "extrusion", "selfmerge"]
+
+# Output01: rooms of a storey that share a face, run by 001_MakeCSV_AdjacentRooms.py and run_building.py
+
+def filter_ifcspaces_by_storey(spaces, storey_name):
+    filtered_spaces = []
+    for space in spaces:
+        for rel in space.Decomposes:
+            if rel.is_a("IfcRelAggregates") and rel.RelatingObject.is_a("IfcBuildingStorey"):
+                if rel.RelatingObject.Name == storey_name:
+                    filtered_spaces.append(space)
+                    break
+    return filtered_spaces
+
+def filter_spaces_by_category(spaces, category_value="Rooms"):
+    filtered_spaces = []
+    
+    for space in spaces:
+        # Get the property sets of the space
+        property_sets = space.IsDefinedBy
+        
+        # Iterate through the property sets and find the 'Other' set with Category
+        for prop_set in property_sets:
+            if hasattr(prop_set, "RelatingPropertyDefinition"):
+                props = prop_set.RelatingPropertyDefinition
+                
+                # Check if it's a property set and contains the 'Category' property
+                if hasattr(props, "HasProperties"):
+                    for prop in props.HasProperties:
+                        if prop.Name == "Category" and prop.NominalValue.wrappedValue == category_value:
+                            filtered_spaces.append(space)
+                            break
+                            
+    return filtered_spaces
+
+def get_guids_of_spaces(spaces):
+    guids = []
+    for space in spaces:
+        guids.append(space.GlobalId)
+    return guids
+
+def checkpointed_adjacency(args, guids, cells, pairs, output_file, stream=True):
+    # Merge engine: ordered pair loop with a checkpoint every --checkpoint-every pairs,
+    # with stream the rows of Output01 are written while the loop runs
+    signature = run_signature(guids, pairs, args.engine, stream)
+
+    # With --workers the rooms go to the worker processes once, every block is checked by the same pool
+    pool = PairPool(cells, cells_share_face, args.workers) if args.workers > 1 and pairs else None
+
+    def check_block(block_start, block):
+        if pool is not None:
+            print(f"Checking room pairs {block_start} - {block_start + len(block)} / {len(pairs)} with {args.workers} workers")
+            return pool.run(block)
+        return (cells_share_face(cells[i], cells[j]) for i, j in block)
+
+    try:
+        touching = checkpointed_pairs("001_rooms", signature, guids, pairs, check_block, args.checkpoint_every, args.resume, output_file if stream else None)
+    finally:
+        if pool is not None:
+            pool.close()
+
+    adjacency = {guids[index]: [guids[j] for j in sorted(partners)] for index, partners in touching.items() if partners}
+    stats = {
+        "pairs_checked": len(pairs),
+        "merges_avoided": len(guids) * (len(guids) - 1) - len(pairs)
+    }
+    return adjacency, stats
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Find rooms that share a face and write Output01")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes for the face checks")
+    parser.add_argument("--engine", choices=ROOM_ENGINES, default="merge", help="Face check: boolean Topology.Merge per pair, analytic extrusion contact, or one Topology.SelfMerge of all rooms of the storey")
+    parser.add_argument("--tile-size", type=float, default=None, help="Split the storey into XY tiles of this size (meters), checked by --workers processes (engines merge and selfmerge)")
+    parser.add_argument("--halo", type=float, default=0.0, help="With --tile-size, margin around every tile (meters), at least the bounding box tolerance")
+    parser.add_argument("--validate", action="store_true", help="With --engine extrusion or selfmerge, also run Topology.Merge on every pair and report differences")
+    parser.add_argument("--incremental", action="store_true", help="Only check pairs with rooms that are new or changed since the last incremental run and patch Output01")
+    parser.add_argument("--geometry", choices=["profiles", "iterator"], default="profiles", help="Room geometry: extruded profiles read from the IFC file or meshes of the ifcopenshell.geom iterator (all representation types, multi-core)")
+    parser.add_argument("--resume", action="store_true", help="With --engine merge, continue an interrupted run from its last checkpoint in .checkpoint/ and the rows in Output01.partial")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="Number of room pairs between two checkpoints")
+    parser.add_argument("--snap-grid", type=float, default=None, help="Weld all room vertices of the storey to a grid of this size (meters) before the merges (opt-in), default: snap_grid of config.yaml, no welding if it is not set")
+    return parser
+
+def run(ifc_file, ifc_file_path, storey_name, args, bbox_tolerance=0.01, cache_dir=".geometry_cache", ifc_spaces=None, placements=None):
+    # ifc_spaces: spaces of the storey if already grouped (building mode), otherwise filtered here
+    # placements: PlacementResolver shared by the storeys of a building
+    if placements is None:
+        placements = PlacementResolver()
+
+    if ifc_spaces is None:
+        # Load Spaces from IFC
+        ifc_spaces = ifc_file.by_type("IfcSpace")
+        print(f"Amount of all IfcSpaces: {len(ifc_spaces)} ")
+
+        # Filter Spaces by storey
+        ifc_spaces = filter_ifcspaces_by_storey(ifc_spaces, storey_name)
+    print(f"Amount of IfcSpaces in specified storey'{storey_name}': {len(ifc_spaces)}")
+
+    # Filter Spaces by category "Rooms"
+    ifc_spaces = filter_spaces_by_category(ifc_spaces, "Rooms")
+    print(f"Number of IfcSpaces with category 'Rooms': {len(ifc_spaces)}")
+
+    # Get GUIDs of filtered IfcSpaces
+    ifc_space_guids = get_guids_of_spaces(ifc_spaces)
+
+    if len(ifc_spaces) != len(ifc_space_guids):
+        print("!! GUIDs dont match Spaces !!")
+
+
+    dic_spaces = {}
+    dic_prisms = {}
+
+    # Reconstructed spaces of earlier runs on the same file
+    cache_params = {"scale": 0.001} if args.geometry == "profiles" else {"scale": 0.001, "geometry": args.geometry}
+    if args.snap_grid:
+        cache_params["snap_grid"] = args.snap_grid
+    geometry_cache = GeometryCache(ifc_file_path, "spaces", cache_params, cache_dir)
+
+    # Profiles of the spaces that are not cached, transformed together below
+    to_reconstruct = []
+    to_tessellate = []
+    dic_boxes = {}
+
+    # Welding once per storey, rooms are in meters like the grid.
+    # Cached rooms were welded in an earlier run, new rooms snap onto their vertices.
+    welder = VertexWelder(args.snap_grid) if args.snap_grid else None
+
+    for index, (space, guid) in enumerate(zip(ifc_spaces, ifc_space_guids), start=1):
+        cached = geometry_cache.get(guid)
+        if cached is not None:
+            if welder is not None:
+                welder.seed(entry_points(cached))
+            dic_spaces[guid] = [topology_from_entry(layer) for layer in cached["layers"]]
+            # Entries written by find_adjacent_rooms have no prism, those rooms use Topology.Merge
+            dic_prisms[guid] = cached.get("prism")
+            continue
+
+        print(f"Reconstructin Space: {index}/{len(ifc_spaces)}, Space Name: {space.Name}, GUID: {guid}")
+        if args.geometry == "iterator":
+            to_tessellate.append(space)
+            continue
+
+        profile_data = read_space_profile(space, placements)
+        if profile_data is None:
+            print(f"No extruded profile found for Space {guid}, skipped")
+            continue
+        to_reconstruct.append((guid, profile_data))
+
+    ### Meshes of the geometry iterator (in meters), no prisms for the extrusion engine
+
+    meshes = tessellate(to_tessellate, ifc_file)
+    if welder is not None:
+        meshes = {guid: welder.weld_mesh(*mesh) for guid, mesh in meshes.items()}
+    for space in to_tessellate:
+        if space.GlobalId not in meshes:
+            continue
+        vertices, triangles = meshes[space.GlobalId]
+        cell = mesh_to_topology(vertices, triangles)
+        if cell is None:
+            print(f"Mesh of Space {space.GlobalId} is no closed cell, skipped")
+            continue
+        dic_spaces[space.GlobalId] = [cell]
+        dic_prisms[space.GlobalId] = None
+        dic_boxes[space.GlobalId] = mesh_bounding_box(vertices)
+        geometry_cache.put(space.GlobalId, {"layers": [topology_to_entry(cell)], "prism": None})
+
+    ### Transformation from local CoordSystem to ProjectCoordSystem (in meters), all spaces in one product
+
+    to_meters = scale_matrix(0.001)
+    matrices = [to_meters @ profile_data["matrix"] for _, profile_data in to_reconstruct]
+    world_profiles = transform_profiles(matrices, [profile_data["points"] for _, profile_data in to_reconstruct])
+    world_extrusions = transform_vectors(matrices, [profile_data["extrusion"] for _, profile_data in to_reconstruct])
+
+    ### Build Topology
+
+    for (guid, _), world_points, world_extrusion in zip(to_reconstruct, world_profiles, world_extrusions):
+        if welder is not None:
+            world_points = welder.weld_profile(world_points)
+            world_extrusion = welder.snap_vector(world_extrusion)
+            if world_points is None:
+                print(f"Profile of Space {guid} collapsed on the snap grid, skipped")
+                continue
+        final_topology = [thickened_cell(world_points, world_extrusion)]
+
+        # Output the transformed topology to verify the translation
+        logging.debug("Transformed Topology: %s", final_topology)
+
+        dic_spaces[guid] = final_topology
+
+        # Profile and Z range of the room for the analytic contact test
+        dic_prisms[guid] = extrusion_prism(world_points, world_extrusion)
+
+        geometry_cache.put(guid, {"layers": [topology_to_entry(layer) for layer in final_topology], "prism": dic_prisms[guid]})
+
+    # Cached and reconstructed rooms in the order of the spaces, like a run without cache
+    dic_spaces = {guid: dic_spaces[guid] for guid in ifc_space_guids if guid in dic_spaces}
+
+    if welder is not None:
+        welder.report()
+    geometry_cache.save()
+    geometry_cache.report()
+    print("-- Reconstruction of Spaces DONE --")
+
+    print("-- Checking for Adjacency of Rooms now --")
+
+    guids = list(dic_spaces.keys())  # List of all GUIDs
+
+    # Broad phase: only rooms whose bounding boxes overlap can share a face
+    boxes = [dic_boxes[guid] if guid in dic_boxes else topology_bounding_box(dic_spaces[guid][0]) for guid in guids]
+    pairs = candidate_pairs(boxes, tolerance=bbox_tolerance)
+    print(f"Bounding box candidates: {len(pairs)} of {len(guids) * (len(guids) - 1) // 2} room pairs")
+
+    # Incremental run: compare the rooms against the manifest of the last run
+    output_file = 'Output01_RoomToRoom_BySeparationLine.csv'
+    dirty = None
+    if args.incremental:
+        manifest = build_manifest(ifc_spaces)
+        # One manifest per IFC file and storey, like 004
+        manifest_step = storey_step("001_rooms", ifc_file_path, storey_name)
+        previous_manifest = load_manifest(manifest_step)
+        if previous_manifest is not None and output_unchanged(manifest_step, output_file):
+            changes = diff_manifests(previous_manifest, manifest)
+            print_changes(changes)
+            dirty = changes["added"] | changes["geometry"]
+            pairs = dirty_pairs(pairs, guids, dirty)
+            print(f"Pairs with new or moved rooms: {len(pairs)}")
+        else:
+            print("No manifest of an earlier run on this storey and Output01, checking all rooms")
+
+    # Each unordered pair is merged once, the result is mirrored to both rooms
+    cells = [dic_spaces[guid][0] for guid in guids]
+    # Output01 rows already written by the pair loop
+    streamed = False
+    if args.tile_size is not None and args.engine == "extrusion":
+        print("Tiles are used with the merge and selfmerge engines, the extrusion engine checks all pairs")
+    if args.tile_size is not None and args.engine != "extrusion":
+        # Tiles of the storey in worker processes, the pairs of all tiles are stitched into one set
+        plan = plan_tiles(boxes, args.tile_size, args.halo, bbox_tolerance, guids, dirty)
+        print(f"{len(plan)} tiles of {args.tile_size} m with {max(args.halo, bbox_tolerance)} m halo")
+        touching, booleans = run_tiled(plan, cells, boxes, room_tile, {"engine": args.engine, "tolerance": bbox_tolerance}, args.workers)
+        touching_cells, stats = mirror_adjacency(guids, pairs, [pair in touching for pair in pairs])
+        stats = {"pairs_checked": booleans, "merges_avoided": len(guids) * (len(guids) - 1) - booleans}
+    elif args.engine == "extrusion":
+        # Analytic test on the profiles, Topology.Merge only where it cannot decide
+        prisms = [dic_prisms[guid] for guid in guids]
+        results = extrusion_pair_checks(pairs, prisms)
+        undecided = [index for index, result in enumerate(results) if result is None]
+        print(f"Extrusion contact decided {len(pairs) - len(undecided)} of {len(pairs)} pairs, {len(undecided)} left for Topology.Merge")
+        fallback_results = run_pair_checks([pairs[index] for index in undecided], cells, cells_share_face, args.workers)
+        for index, result in zip(undecided, fallback_results):
+            results[index] = result
+
+        if args.validate:
+            merge_results = run_pair_checks(pairs, cells, cells_share_face, args.workers)
+            mismatches = [(guids[i], guids[j]) for (i, j), result, expected in zip(pairs, results, merge_results) if result != expected]
+            print(f"Validation against Topology.Merge: {len(mismatches)} of {len(pairs)} pairs differ")
+            for guid1, guid2 in mismatches:
+                logging.debug(f"Extrusion contact differs from Topology.Merge: {guid1} - {guid2}")
+
+        touching_cells, stats = mirror_adjacency(guids, pairs, results)
+    elif args.engine == "selfmerge":
+        # The internal faces of the merged storey give all touching rooms at once
+        touching, booleans = storey_self_merge_pairs(cells, boxes, bbox_tolerance)
+        results = [pair in touching for pair in pairs]
+
+        if args.validate:
+            merge_results = run_pair_checks(pairs, cells, cells_share_face, args.workers)
+            mismatches = [(guids[i], guids[j]) for (i, j), result, expected in zip(pairs, results, merge_results) if result != expected]
+            print(f"Validation against Topology.Merge: {len(mismatches)} of {len(pairs)} pairs differ")
+            for guid1, guid2 in mismatches:
+                logging.debug(f"Self merge differs from Topology.Merge: {guid1} - {guid2}")
+
+        touching_cells, stats = mirror_adjacency(guids, pairs, results)
+        stats = {"pairs_checked": booleans, "merges_avoided": len(guids) * (len(guids) - 1) - booleans}
+    else:
+        touching_cells, stats = checkpointed_adjacency(args, guids, cells, pairs, output_file, stream=dirty is None)
+        streamed = dirty is None
+    print(f"Merges run: {stats['pairs_checked']}, merges avoided: {stats['merges_avoided']}")
+
+    if dirty is not None:
+        # Unchanged room pairs keep their row entries from the last Output01
+        touching_cells = patch_adjacency(read_adjacency_csv(output_file), guids, touching_cells, dirty)
+
+    # Write the data to a CSV file, replaced atomically when complete
+    if not streamed:
+        with StreamingCSVWriter(output_file) as writer:
+            for cell_name, touch_cell_names in touching_cells.items():
+                if cell_name not in touch_cell_names:
+                    touching_guids = ",".join(touch_cell_names)
+                    writer.writerow([cell_name, touching_guids])
+
+    print("-- Data has been written to Output01_RoomToRoom_BySeparationLine.csv --")
+    write_edge_parquet(output_file, storey_name, building_name(ifc_file, storey_name))
+
+    if args.incremental:
+        save_manifest(manifest_step, manifest)
+        save_output_digest(manifest_step, output_file)
@@ -0,0 +1,149 @@
+import os
+import re
+import time
+import logging
+import argparse
+import multiprocessing
+import yaml
+import ifcopenshell
+import room_adjacency
+import wall_adjacency
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ifc_data_to_csv import build_relationship_index, storey_relationships_to_csv
+from placement import PlacementResolver
+
+GROUPED_TYPES = ["IfcSpace", "IfcWall", "IfcDoor", "IfcWindow"]
+
+# --- Functions to split a building into storeys ---
+def group_by_storey(ifc_file):
+    # One traversal of the spatial relations instead of a storey filter per script and storey
+    groups = {}
+    for storey in ifc_file.by_type("IfcBuildingStorey"):
+        groups.setdefault(storey.Name, {ifc_type: [] for ifc_type in GROUPED_TYPES})
+
+    # Spaces are aggregated by the storey, like in filter_ifcspaces_by_storey
+    for rel in ifc_file.by_type("IfcRelAggregates"):
+        if rel.RelatingObject.is_a("IfcBuildingStorey"):
+            for related_object in rel.RelatedObjects:
+                if related_object.is_a("IfcSpace"):
+                    groups[rel.RelatingObject.Name]["IfcSpace"].append(related_object)
+
+    # Walls, doors and windows are contained in the storey
+    for rel in ifc_file.by_type("IfcRelContainedInSpatialStructure"):
+        if rel.RelatingStructure.is_a("IfcBuildingStorey"):
+            for element in rel.RelatedElements:
+                for ifc_type in ["IfcWall", "IfcDoor", "IfcWindow"]:
+                    if element.is_a(ifc_type):
+                        groups[rel.RelatingStructure.Name][ifc_type].append(element)
+
+    # File order, so the CSV rows match a single storey run
+    for group in groups.values():
+        for ifc_type in GROUPED_TYPES:
+            group[ifc_type].sort(key=lambda element: element.id())
+    return groups
+
+def storey_folder(storey_name, storey_folders=None):
+    # Folder below 20_GRAPH-DATA/<building>/, e.g. "PLAN 11, TRH 1" -> "Plan 11" via storey_folders
+    if storey_folders and storey_name in storey_folders:
+        return storey_folders[storey_name]
+    return re.sub(r'[\\/:*?"<>|]', "_", storey_name).strip()
+
+# --- Functions for the storey workers ---
+# Parsed file, storey groups and relationship index of the building, shared by all storeys of a process
+_building = {}
+
+def load_building(ifc_file_path):
+    ifc_file = ifcopenshell.open(ifc_file_path)
+    _building["ifc_file"] = ifc_file
+    _building["ifc_file_path"] = ifc_file_path
+    _building["groups"] = group_by_storey(ifc_file)
+    _building["relationship_index"] = build_relationship_index(ifc_file)
+    # Storey and building placements are resolved once for all storeys
+    _building["placements"] = PlacementResolver()
+
+def _init_building(ifc_file_path):
+    # Forked workers inherit the parsed building, spawned workers parse it once each
+    if _building.get("ifc_file_path") != ifc_file_path:
+        load_building(ifc_file_path)
+
+def run_storey(storey_name, output_dir, options):
+    start = time.time()
+    ifc_file = _building["ifc_file"]
+    ifc_file_path = _building["ifc_file_path"]
+    group = _building["groups"][storey_name]
+
+    # The steps write their Output CSVs to the working directory
+    previous_dir = os.getcwd()
+    os.makedirs(output_dir, exist_ok=True)
+    os.chdir(output_dir)
+    try:
+        print(f"-- {storey_name}: Output02-05 --")
+        storey_relationships_to_csv(ifc_file, storey_name, group["IfcSpace"], group["IfcDoor"], group["IfcWindow"], _building["relationship_index"])
+
+        print(f"-- {storey_name}: Output01 --")
+        room_adjacency.run(ifc_file, ifc_file_path, storey_name, options["rooms_args"], options["bbox_tolerance"], options["cache_dir"], group["IfcSpace"], _building["placements"])
+
+        print(f"-- {storey_name}: Output06 --")
+        wall_adjacency.run(ifc_file, ifc_file_path, storey_name, options["walls_args"], options["cache_dir"], group["IfcWall"], _building["placements"])
+    finally:
+        os.chdir(previous_dir)
+
+    return storey_name, time.time() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Write Output01-06 for all storeys of a building, parsing the IFC file once")
+    parser.add_argument("--workers", type=int, default=1, help="Number of storeys processed in parallel")
+    parser.add_argument("--engine", choices=[engine for engine in room_adjacency.ROOM_ENGINES if engine in wall_adjacency.WALL_ENGINES], default="merge", help="Face check of steps 001 and 003")
+    parser.add_argument("--room-engine", choices=room_adjacency.ROOM_ENGINES, default=None, help="Face check of step 001, default: --engine")
+    parser.add_argument("--wall-engine", choices=wall_adjacency.WALL_ENGINES, default=None, help="Face check of step 003, default: --engine")
+    parser.add_argument("--geometry", choices=["profiles", "iterator"], default="profiles", help="Geometry source of steps 001 and 003")
+    parser.add_argument("--storeys", nargs="*", help="Storey names, default: storeys from config.yaml or all storeys with spaces")
+    args = parser.parse_args()
+
+    # Setup logging
+    logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s %(levelname)s: %(message)s')
+
+    # Load config.yaml
+    with open("config.yaml", "r") as f:
+        config = yaml.safe_load(f)
+
+    # Absolute paths, the storey runs change the working directory
+    ifc_file_path = os.path.abspath(config["ifc_file"])
+    building_name = config.get("building_name") or os.path.splitext(os.path.basename(ifc_file_path))[0]
+    output_root = os.path.abspath(config.get("output_root", "../20_GRAPH-DATA"))
+    cache_dir = config.get("geometry_cache_dir", ".geometry_cache")
+    step_args = ["--geometry", args.geometry]
+    if config.get("snap_grid"):
+        step_args += ["--snap-grid", str(config["snap_grid"])]
+    options = {
+        "rooms_args": room_adjacency.build_parser().parse_args(["--engine", args.room_engine or args.engine] + step_args),
+        "walls_args": wall_adjacency.build_parser().parse_args(["--engine", args.wall_engine or args.engine] + step_args),
+        "bbox_tolerance": config.get("bbox_tolerance", 0.01),
+        "cache_dir": os.path.abspath(cache_dir) if cache_dir else None
+    }
+
+    # Parse and group once, forked workers reuse this
+    load_building(ifc_file_path)
+    groups = _building["groups"]
+    storeys = args.storeys or config.get("storeys") or [name for name, group in groups.items() if group["IfcSpace"]]
+    missing = [name for name in storeys if name not in groups]
+    if missing:
+        raise ValueError(f"Storeys not found in {ifc_file_path}: {missing}")
+
+    jobs = [(name, os.path.join(output_root, building_name, storey_folder(name, config.get("storey_folders")))) for name in storeys]
+    print(f"Building {building_name}: {len(jobs)} storeys -> {os.path.join(output_root, building_name)}")
+
+    if args.workers > 1:
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=_init_building, initargs=(ifc_file_path,)) as executor:
+            futures = [executor.submit(run_storey, name, output_dir, options) for name, output_dir in jobs]
+            for future in as_completed(futures):
+                storey_name, seconds = future.result()
+                print(f"Storey {storey_name} done in {seconds:.1f} s")
+    else:
+        for name, output_dir in jobs:
+            storey_name, seconds = run_storey(name, output_dir, options)
+            print(f"Storey {storey_name} done in {seconds:.1f} s")
+
+if __name__ == "__main__":
+    main()
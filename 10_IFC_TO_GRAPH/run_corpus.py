@@ -0,0 +1,241 @@
+import os
+import sys
+import csv
+import json
+import time
+import hashlib
+import argparse
+import threading
+import subprocess
+import yaml
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from run_building import storey_folder
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Pipeline steps, their Output files and the steps they read from
+STEPS = {
+    "002": {"script": "002_MakeCSV_ReadFromIFC.py", "after": [], "outputs": [
+        "Output02_RoomToRoom_ByDoors.csv", "Output03_RoomToRoom_ByWindows.csv",
+        "Output04_RoomBoundingWalls.csv", "Output05_Hosts_of_WindowsAndDoors.csv"]},
+    "001": {"script": "001_MakeCSV_AdjacentRooms.py", "after": [], "outputs": ["Output01_RoomToRoom_BySeparationLine.csv"]},
+    "003": {"script": "003_MakeCSV_AdjacentWalls.py", "after": [], "outputs": ["Output06_Wall_Adjacancy.csv"]},
+    "004": {"script": "004_BuildGraph.py", "after": ["001", "002", "003"], "outputs": [], "neo4j": True},
+    "005A": {"script": "005A_EnrichtGraph_Alternative.py", "after": ["004"], "outputs": [], "neo4j": True},
+}
+DEFAULT_STEPS = ["002", "001", "003"]
+
+# Neo4j credentials stay out of the storey folders, the graph steps get them through the environment
+CREDENTIALS = {"username": "NEO4J_USERNAME", "password": "NEO4J_PASSWORD"}
+
+# --- Jobs ---
+def file_signature(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def code_signature():
+    # Content of all modules next to the step scripts, a fix in a shared module (adjacency_functions, placement, ...)
+    # changes the result of every step that imports it
+    sha = hashlib.sha256()
+    for name in sorted(os.listdir(SCRIPT_DIR)):
+        if name.endswith(".py"):
+            sha.update(name.encode("utf-8"))
+            with open(os.path.join(SCRIPT_DIR, name), "rb") as f:
+                sha.update(f.read())
+    return sha.hexdigest()
+
+def job_signature(job, jobs, code):
+    # Inputs of a job: IFC file, pipeline code, job config and the signatures of the jobs it reads from
+    parts = [
+        file_signature(job["ifc_file"]),
+        job["step"],
+        code,
+        json.dumps(job["config"], sort_keys=True),
+        " ".join(job["args"])
+    ]
+    for dependency in job["after"]:
+        parts.append(jobs[dependency]["signature"])
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+def stamp_path(job):
+    return os.path.join(job["output_dir"], ".corpus", f"{job['step']}.json")
+
+def is_up_to_date(job):
+    if not os.path.exists(stamp_path(job)):
+        return False
+    with open(stamp_path(job), "r") as f:
+        stamp = json.load(f)
+    outputs_exist = all(os.path.exists(os.path.join(job["output_dir"], output)) for output in STEPS[job["step"]]["outputs"])
+    return outputs_exist and stamp["signature"] == job["signature"]
+
+def write_stamp(job, seconds):
+    os.makedirs(os.path.dirname(stamp_path(job)), exist_ok=True)
+    with open(stamp_path(job), "w") as f:
+        json.dump({"signature": job["signature"], "seconds": seconds}, f)
+
+def build_jobs(corpus, config, steps, output_root):
+    jobs = {}
+    for building in corpus["buildings"]:
+        ifc_file = os.path.abspath(building["ifc_file"])
+        for storey in building["storeys"]:
+            storey_name = storey["name"] if isinstance(storey, dict) else storey
+            folder = storey.get("folder") if isinstance(storey, dict) else None
+            output_dir = os.path.join(output_root, building["name"], folder or storey_folder(storey_name))
+
+            # config.yaml of the step scripts, written to the storey folder they run in
+            job_config = {key: value for key, value in config.items() if key not in ["storeys", "storey_folders"] + list(CREDENTIALS)}
+            job_config["ifc_file"] = ifc_file
+            job_config["storey_name"] = storey_name
+            if job_config.get("geometry_cache_dir"):
+                job_config["geometry_cache_dir"] = os.path.abspath(job_config["geometry_cache_dir"])
+
+            for step in steps:
+                key = (building["name"], storey_name, step)
+                jobs[key] = {
+                    "building": building["name"],
+                    "storey": storey_name,
+                    "step": step,
+                    "ifc_file": ifc_file,
+                    "output_dir": output_dir,
+                    "config": job_config,
+                    "args": corpus.get("step_args", {}).get(step, []),
+                    "after": [(building["name"], storey_name, dependency) for dependency in STEPS[step]["after"] if dependency in steps]
+                }
+
+    # Signatures in dependency order (DEFAULT_STEPS first, graph steps after)
+    code = code_signature()
+    for step in [step for step in STEPS if step in steps]:
+        for job in jobs.values():
+            if job["step"] == step:
+                job["signature"] = job_signature(job, jobs, code)
+    return jobs
+
+# --- Running ---
+# Steps 004 and 005A write to the same Neo4j database, one at a time
+neo4j_lock = threading.Lock()
+
+def write_job_configs(jobs):
+    # One config.yaml per storey folder before any job starts, the steps of a storey run at the same time and read it.
+    # Replaced atomically, so a step never reads a half written file.
+    for output_dir, job_config in {job["output_dir"]: job["config"] for job in jobs.values()}.items():
+        os.makedirs(output_dir, exist_ok=True)
+        config_path = os.path.join(output_dir, "config.yaml")
+        with open(f"{config_path}.tmp", "w") as f:
+            yaml.safe_dump(job_config, f, allow_unicode=True)
+        os.replace(f"{config_path}.tmp", config_path)
+
+def run_job(job, environment=None):
+    command = [sys.executable, os.path.join(SCRIPT_DIR, STEPS[job["step"]]["script"])] + job["args"]
+    log_path = os.path.join(job["output_dir"], ".corpus", f"{job['step']}.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+    lock = neo4j_lock if STEPS[job["step"]].get("neo4j") else None
+    if lock:
+        lock.acquire()
+    try:
+        start = time.time()
+        with open(log_path, "w") as log:
+            process = subprocess.Popen(command, cwd=job["output_dir"], stdout=log, stderr=subprocess.STDOUT, env=environment)
+            max_rss_mb = wait_for_job(process)
+        seconds = time.time() - start
+    finally:
+        if lock:
+            lock.release()
+
+    return process.returncode, seconds, max_rss_mb
+
+def wait_for_job(process):
+    # Peak memory of exactly this child in MB, 0.0 where wait4 is missing (Windows)
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return 0.0
+    _, status, usage = os.wait4(process.pid, 0)
+    # waitstatus_to_exitcode needs Python 3.9
+    if hasattr(os, "waitstatus_to_exitcode"):
+        process.returncode = os.waitstatus_to_exitcode(status)
+    elif os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    # ru_maxrss is in KB on Linux
+    return usage.ru_maxrss / 1024
+
+def run_jobs(jobs, workers, force=False, environment=None):
+    results = {}
+    pending = dict(jobs)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for key, job in list(pending.items()):
+                if any(dependency not in results for dependency in job["after"]):
+                    continue
+                del pending[key]
+
+                if any(results[dependency]["status"] in ["failed", "blocked"] for dependency in job["after"]):
+                    results[key] = {"status": "blocked", "seconds": 0.0, "max_rss_mb": 0.0}
+                elif not force and is_up_to_date(job):
+                    results[key] = {"status": "up to date", "seconds": 0.0, "max_rss_mb": 0.0}
+                else:
+                    print(f"Start {key[0]} / {key[1]} / {key[2]}")
+                    running[executor.submit(run_job, job, environment)] = key
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                returncode, seconds, max_rss_mb = future.result()
+                status = "done" if returncode == 0 else "failed"
+                if status == "done":
+                    write_stamp(jobs[key], seconds)
+                results[key] = {"status": status, "seconds": seconds, "max_rss_mb": max_rss_mb}
+                print(f"{status.capitalize()} {key[0]} / {key[1]} / {key[2]} in {seconds:.1f} s, {max_rss_mb:.0f} MB")
+    return results
+
+def write_report(results, report_path):
+    with open(report_path, mode='w', newline='') as file:
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(["building", "storey", "step", "status", "seconds", "max_rss_mb"])
+        for (building, storey, step), result in results.items():
+            writer.writerow([building, storey, step, result["status"], f"{result['seconds']:.1f}", f"{result['max_rss_mb']:.0f}"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline steps for every building and storey of a corpus manifest")
+    parser.add_argument("corpus", nargs="?", default="corpus.yaml", help="Manifest with the IFC files and storeys")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of jobs running at the same time")
+    parser.add_argument("--steps", nargs="*", choices=list(STEPS.keys()), default=DEFAULT_STEPS, help="Steps to run per storey")
+    parser.add_argument("--force", action="store_true", help="Run jobs even if their outputs are up to date")
+    args = parser.parse_args()
+
+    with open(args.corpus, "r") as f:
+        corpus = yaml.safe_load(f)
+
+    # Settings shared by all jobs (tolerances, Neo4j credentials, cache)
+    with open("config.yaml", "r") as f:
+        config = yaml.safe_load(f)
+
+    output_root = os.path.abspath(corpus.get("output_root", config.get("output_root", "../20_GRAPH-DATA")))
+    jobs = build_jobs(corpus, config, args.steps, output_root)
+    print(f"{len(jobs)} jobs for {len(corpus['buildings'])} buildings")
+
+    write_job_configs(jobs)
+
+    # Credentials from config.yaml unless they are already set in the environment
+    environment = dict(os.environ)
+    for key, variable in CREDENTIALS.items():
+        if key in config:
+            environment.setdefault(variable, str(config[key]))
+
+    results = run_jobs(jobs, args.workers, args.force, environment)
+
+    report_path = os.path.join(output_root, "corpus_report.csv")
+    write_report(results, report_path)
+    counts = {}
+    for result in results.values():
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print(f"Summary: {counts}, report written to {report_path}")
+
+if __name__ == "__main__":
+    main()
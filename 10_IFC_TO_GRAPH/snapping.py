@@ -0,0 +1,105 @@
+import math
+import numpy as np
+
+# --- Vertex welding on a hash grid ---
+class VertexWelder:
+    # One welder per storey, so neighbouring elements end up with identical coordinates before any boolean.
+    # A vertex within half a grid step (per axis) of an earlier vertex takes over its representative,
+    # otherwise it becomes a new representative, rounded to the grid.
+    # Vertices of cached elements were welded in an earlier run, they are seeded as fixed representatives.
+    def __init__(self, grid):
+        self.grid = grid
+        self.half = grid / 2
+        self.cells = {}
+        self.seeds = {}
+        self.seeded = 0
+        self.vertices = 0
+        self.welded = 0
+
+    def seed(self, points):
+        for x, y, z in set(map(tuple, np.asarray(points, dtype=float).reshape(-1, 3).tolist())):
+            self.seeds.setdefault((math.floor(x / self.grid), math.floor(y / self.grid), math.floor(z / self.grid)), []).append((x, y, z))
+            self.seeded += 1
+
+    def nearest_seed(self, x, y, z, key_x, key_y, key_z):
+        # The unwelded source of a seed was within half a step of it, a vertex within half a step of that
+        # source is within one step of the seed, so seeds catch vertices up to one grid step away
+        nearest = None
+        nearest_distance = self.grid
+        for cell_x in (key_x - 1, key_x, key_x + 1):
+            for cell_y in (key_y - 1, key_y, key_y + 1):
+                for cell_z in (key_z - 1, key_z, key_z + 1):
+                    for seed in self.seeds.get((cell_x, cell_y, cell_z), ()):
+                        distance = max(abs(x - seed[0]), abs(y - seed[1]), abs(z - seed[2]))
+                        if distance <= nearest_distance:
+                            nearest, nearest_distance = seed, distance
+        return nearest
+
+    def weld_point(self, x, y, z):
+        self.vertices += 1
+        key_x, key_y, key_z = math.floor(x / self.grid), math.floor(y / self.grid), math.floor(z / self.grid)
+        if self.seeds:
+            seed = self.nearest_seed(x, y, z, key_x, key_y, key_z)
+            if seed is not None:
+                self.welded += 1
+                return seed
+        # Earlier vertices closer than half a step lie in this or one of the 26 neighbouring cells
+        for cell_x in (key_x - 1, key_x, key_x + 1):
+            for cell_y in (key_y - 1, key_y, key_y + 1):
+                for cell_z in (key_z - 1, key_z, key_z + 1):
+                    for source_x, source_y, source_z, representative in self.cells.get((cell_x, cell_y, cell_z), ()):
+                        if abs(x - source_x) <= self.half and abs(y - source_y) <= self.half and abs(z - source_z) <= self.half:
+                            self.welded += 1
+                            return representative
+
+        representative = (round(x / self.grid) * self.grid, round(y / self.grid) * self.grid, round(z / self.grid) * self.grid)
+        self.cells.setdefault((key_x, key_y, key_z), []).append((x, y, z, representative))
+        return representative
+
+    def weld(self, points):
+        points = np.asarray(points, dtype=float)
+        return np.array([self.weld_point(*point) for point in points.reshape(-1, 3).tolist()]).reshape(points.shape)
+
+    def weld_profile(self, points):
+        # Edges shorter than the grid collapse, their repeated vertex is dropped (the closing edge as well).
+        # None if less than 3 points are left
+        welded = self.weld(points)
+        keep = np.ones(len(welded), dtype=bool)
+        keep[1:] = np.any(welded[1:] != welded[:-1], axis=1)
+        welded = welded[keep]
+        if len(welded) > 1 and np.all(welded[-1] == welded[0]):
+            welded = welded[:-1]
+        return welded if len(welded) >= 3 else None
+
+    def weld_faces(self, points, faces):
+        # IfcPolygonalFaceSet: welded points, collapsed corners removed from the (1-based) faces
+        welded = self.weld(points)
+        cleaned = []
+        for indices in faces:
+            corners = []
+            for index in indices:
+                if not corners or tuple(welded[index - 1]) != tuple(welded[corners[-1] - 1]):
+                    corners.append(index)
+            if len(corners) > 1 and tuple(welded[corners[0] - 1]) == tuple(welded[corners[-1] - 1]):
+                corners.pop()
+            if len(corners) >= 3:
+                cleaned.append(corners)
+        return welded, cleaned
+
+    def weld_mesh(self, vertices, triangles):
+        # Triangles with two corners on the same representative are dropped
+        welded = self.weld(vertices)
+        corners = welded[triangles]
+        degenerate = (
+            np.all(corners[:, 0] == corners[:, 1], axis=1) |
+            np.all(corners[:, 1] == corners[:, 2], axis=1) |
+            np.all(corners[:, 0] == corners[:, 2], axis=1)
+        )
+        return welded, triangles[~degenerate]
+
+    def snap_vector(self, vector):
+        # Extrusion vectors on the grid, so welded base points plus extrusion stay on the grid
+        return np.round(np.asarray(vector, dtype=float) / self.grid) * self.grid
+
+    def report(self):
+        print(f"Vertex welding on a {self.grid} grid: {self.vertices} vertices, {self.welded} welded onto earlier ones, {self.seeded} seeded from the cache")
@@ -0,0 +1,136 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+from topologicpy.Topology import Topology
+from adjacency_functions import (
+    boxes_overlap,
+    cells_share_face,
+    find_touching_walls,
+    touching_layers,
+    self_merge_tile,
+    topology_to_arrays,
+    topology_from_arrays,
+)
+
+# --- Tiles of a storey ---
+# Square XY tiles of tile_size, every element belongs to all tiles its box reaches within the halo.
+# A pair is checked only in its home tile (tile of the lower corner of the overlap of the two boxes),
+# which holds both elements as long as the halo is at least the contact tolerance.
+def tile_key(x, y, tile_size):
+    return (math.floor(x / tile_size), math.floor(y / tile_size))
+
+def home_tile(box1, box2, tile_size):
+    return tile_key(max(box1[0], box2[0]), max(box1[1], box2[1]), tile_size)
+
+def storey_tiles(boxes, tile_size, halo):
+    # {tile key: [element indices]} in index order
+    tiles = {}
+    for index, box in enumerate(boxes):
+        min_x, min_y = tile_key(box[0] - halo, box[1] - halo, tile_size)
+        max_x, max_y = tile_key(box[3] + halo, box[4] + halo, tile_size)
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                tiles.setdefault((x, y), []).append(index)
+    return tiles
+
+def tile_pairs(key, members, boxes, tile_size, tolerance, keys=None, dirty=None):
+    # Candidate pairs (i < j) whose home is this tile, with dirty only pairs with a new or moved element
+    pairs = []
+    for a in range(len(members)):
+        for b in range(a + 1, len(members)):
+            i, j = members[a], members[b]
+            if dirty is not None and keys[i] not in dirty and keys[j] not in dirty:
+                continue
+            if boxes_overlap(boxes[i], boxes[j], tolerance) and home_tile(boxes[i], boxes[j], tile_size) == key:
+                pairs.append((i, j))
+    return pairs
+
+def plan_tiles(boxes, tile_size, halo, tolerance, keys=None, dirty=None):
+    # [(tile key, members, pairs)] for the tiles with at least one pair, sorted by key
+    halo = max(halo, tolerance)
+    plan = []
+    for key, members in sorted(storey_tiles(boxes, tile_size, halo).items()):
+        pairs = tile_pairs(key, members, boxes, tile_size, tolerance, keys, dirty)
+        if pairs:
+            # Only the elements of the pairs travel to the worker
+            used = sorted({index for pair in pairs for index in pair})
+            plan.append((key, used, pairs))
+    return plan
+
+# --- Scheduler ---
+def run_tiles(tasks, tile_function, workers=1):
+    # Results in task order. Tasks are built lazily and at most 2 per worker are in flight,
+    # so only the geometry of these tiles is held by the pool at any time.
+    if workers <= 1:
+        for task in tasks:
+            yield tile_function(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for task in tasks:
+            pending.append(executor.submit(tile_function, task))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+def tile_tasks(plan, topologies, boxes, options):
+    for key, members, pairs in plan:
+        yield {
+            "key": key,
+            "members": members,
+            "arrays": [topology_to_arrays(topologies[index]) for index in members],
+            "boxes": [boxes[index] for index in members],
+            "pairs": pairs,
+            "options": options
+        }
+
+def run_tiled(plan, topologies, boxes, tile_function, options, workers=1, start=0, touching=None, on_tile=None):
+    # Stitches the pairs of the tiles from start on into one set, every pair is checked in its home tile only.
+    # on_tile(tiles done, touching) runs after every finished tile (checkpoints)
+    touching = set() if touching is None else touching
+    booleans = 0
+    results = run_tiles(tile_tasks(plan[start:], topologies, boxes, options), tile_function, workers)
+    for number, (hits, tile_booleans) in enumerate(results, start=start + 1):
+        print(f"Tile {number} / {len(plan)} done: {len(plan[number - 1][1])} elements, {len(hits)} touching pairs")
+        touching.update(tuple(pair) for pair in hits)
+        booleans += tile_booleans
+        if on_tile is not None:
+            on_tile(number, touching)
+    return touching, booleans
+
+# --- Tile functions (run in the workers) ---
+def room_tile(task):
+    # Returns (touching pairs, booleans run) of one tile of rooms
+    cells = {index: topology_from_arrays(arrays) for index, arrays in zip(task["members"], task["arrays"])}
+    boxes = dict(zip(task["members"], task["boxes"]))
+    tolerance = task["options"]["tolerance"]
+
+    if task["options"]["engine"] == "selfmerge":
+        touching, booleans = self_merge_tile(cells, boxes, task["members"], tolerance, task["pairs"])
+        # Pairs found here whose home is another tile are reported there
+        home = set(task["pairs"])
+        return [pair for pair in touching if pair in home], booleans
+
+    touching = [pair for pair in task["pairs"] if cells_share_face(cells[pair[0]], cells[pair[1]])]
+    return touching, len(task["pairs"])
+
+def wall_tile(task):
+    # Returns (touching pairs, merges run) of one tile of walls, the topologies are clusters of the layer cells
+    walls = {index: topology_from_arrays(arrays) for index, arrays in zip(task["members"], task["arrays"])}
+    engine = task["options"]["engine"]
+    # In project units, converted by the caller
+    tolerance = task["options"]["layer_tolerance"]
+
+    touching = []
+    merges = 0
+    for i, j in task["pairs"]:
+        if engine == "layers":
+            hit, pair_merges, _ = touching_layers(Topology.Cells(walls[i]), Topology.Cells(walls[j]), tolerance=tolerance)
+            merges += pair_merges
+        else:
+            hit = find_touching_walls(walls[i], walls[j])
+            merges += 1
+        if hit:
+            touching.append((i, j))
+    return touching, merges
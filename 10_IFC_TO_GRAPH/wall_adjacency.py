@@ -0,0 +1,335 @@
+import logging
+from topologicpy.Topology import Topology
+from topologicpy.Dictionary import Dictionary
+from topologicpy.Cluster import Cluster
+from topologicpy.CellComplex import CellComplex
+import argparse
+from functools import partial
+from adjacency_functions import (
+    find_touching_walls, layer_cells_share_face, PairPool,
+    touching_layers, find_touching_walls_by_layers, layer_bounding_boxes, topology_bounding_box, DEFAULT_LAYER_TOLERANCE,
+    PairWatchdog
+)
+from tiling import plan_tiles, run_tiled, wall_tile
+from snapping import VertexWelder
+from extrusion_contact import layered_prisms_share_face, layered_prisms_contact, DEFAULT_TOLERANCE
+from ifc_tessellation import project_unit_scale
+from reconstruction import reconstruct_walls, tessellate_walls
+from csv_output import StreamingCSVWriter
+from edge_table import write_edge_parquet, building_name
+from checkpoint import run_signature, load_checkpoint, save_checkpoint, remove_checkpoint, checkpointed_pairs
+from geometry_cache import GeometryCache, topology_to_entry, topology_from_entry, entry_points
+from incremental import storey_step, build_manifest, load_manifest, save_manifest, save_output_digest, output_unchanged, diff_manifests, print_changes, dirty_pairs, read_adjacency_csv, patch_adjacency
+
+# Face checks of --engine
+WALL_ENGINES = ["merge", "extrusion", "layers"]
+
+# Output06: walls of a storey whose layers share a face, run by 003_MakeCSV_AdjacentWalls.py and run_building.py
+
+def get_ifc_guid(topo):
+    topo_dict = Topology.Dictionary(topo)
+    print(topo_dict)
+    text = Dictionary.ValueAtKey(topo_dict, "guid")
+    print(text)
+    return text
+
+def find_ifc_storey(ifc_file, storey_name):
+    target_storey = None
+    for storey in ifc_file.by_type("IfcBuildingStorey"):
+        if storey.Name == storey_name:
+            target_storey = storey
+            break
+
+    if not target_storey:
+        print(f"Storey with name '{storey_name}' was not found.")
+    else:
+        print(f"Storey '{storey_name}' found. OID: {target_storey.id()}")
+        return target_storey
+
+def fallback_contact(prisms1, prisms2, contact_tolerance):
+    # Pairs whose merge ran over the time budget: extrusion contact of the layer prisms (tolerance in project units).
+    # None if a layer pair is left that only a merge could decide, such pairs are not guessed
+    touching, pending = layered_prisms_contact(prisms1, prisms2, contact_tolerance)
+    if touching:
+        return True
+    return None if pending else False
+
+def tiled_wall_pairs(args, keys, dic_walls, dirty, signature, layer_tolerance):
+    # Touching pairs (i, j) of all tiles, with a checkpoint after every finished tile
+    # layer_tolerance: in project units like the walls
+    # Layer clusters keep the layer set order for the workers
+    walls = [Cluster.ByTopologies(dic_walls[key]) for key in keys]
+    boxes = [topology_bounding_box(wall) for wall in walls]
+    plan = plan_tiles(boxes, args.tile_size, args.halo, layer_tolerance, keys, dirty)
+    print(f"{len(plan)} tiles of {args.tile_size} with {max(args.halo, layer_tolerance)} halo, {sum(len(pairs) for _, _, pairs in plan)} wall pairs")
+
+    state = load_checkpoint("003_walls", signature) if args.resume else None
+    start = state["position"] if state else 0
+    touching = {tuple(pair) for pair in state["hits"]} if state else set()
+    if state:
+        print(f"Resuming at tile {start} / {len(plan)} with {len(touching)} touching pairs")
+
+    def checkpoint(tiles_done, touching):
+        save_checkpoint("003_walls", {"signature": signature, "position": tiles_done, "hits": sorted(touching)})
+
+    options = {"engine": args.engine, "layer_tolerance": layer_tolerance}
+    touching, merges = run_tiled(plan, walls, boxes, wall_tile, options, args.workers, start, touching, checkpoint)
+    print(f"Merges run: {merges}")
+    return sorted(touching)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Find walls whose layers share a face and write Output06")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes for the face checks")
+    parser.add_argument("--engine", choices=WALL_ENGINES, default="merge", help="Face check: boolean Topology.Merge of all layer pairs, analytic extrusion contact, or Topology.Merge of box pruned layer pairs (outer layers first)")
+    parser.add_argument("--layer-tolerance", type=float, default=DEFAULT_LAYER_TOLERANCE, help="Distance (meters) up to which layer boxes count as touching, used by --engine layers and the tiling halo")
+    parser.add_argument("--validate", action="store_true", help="With --engine extrusion or layers, also run Topology.Merge on every pair and report differences")
+    parser.add_argument("--incremental", action="store_true", help="Only check pairs with walls that are new or changed since the last incremental run and patch Output06")
+    parser.add_argument("--geometry", choices=["profiles", "iterator"], default="profiles", help="Wall geometry: layer profiles read from the IFC file or meshes of the ifcopenshell.geom iterator (all representation types, multi-core)")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its last checkpoint in .checkpoint/")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="Number of wall pairs between two checkpoints")
+    parser.add_argument("--pair-budget", type=float, default=None, help="Seconds per wall pair for Topology.Merge in supervised worker processes (--workers of them), slower pairs are killed and decided by the extrusion test, pairs it cannot decide are recorded as not touching and listed at the end")
+    parser.add_argument("--snap-grid", type=float, default=None, help="Weld all wall vertices of the storey to a grid of this size (meters) before the merges (opt-in), default: snap_grid of config.yaml, no welding if it is not set")
+    parser.add_argument("--tile-size", type=float, default=None, help="Split the storey into XY tiles of this size (project units), checked by --workers processes (engines merge and layers)")
+    parser.add_argument("--halo", type=float, default=0.0, help="With --tile-size, margin around every tile (project units), at least the layer tolerance")
+    return parser
+
+def run(ifc_file, ifc_file_path, storey_name, args, cache_dir=".geometry_cache", ifc_walls=None, placements=None):
+    # ifc_walls: walls of the storey if already grouped (building mode), otherwise collected here
+    # placements: PlacementResolver shared by the storeys of a building
+    if ifc_walls is None:
+        # Find corresponding IfcBuildingStorey
+        ifc_storey = find_ifc_storey(ifc_file, storey_name)
+
+        wall_guids = []
+
+        # Iterate all IfcWalls
+        for wall in ifc_file.by_type("IfcWall"):
+            if wall.ContainedInStructure:
+                for rel in wall.ContainedInStructure:
+                    # Check if Wall is in TargetStorey
+                    if rel.RelatingStructure == ifc_storey:
+                        wall_guids.append(wall.GlobalId)
+    else:
+        wall_guids = [wall.GlobalId for wall in ifc_walls]
+
+    print("GUIDs von Wänden in Plan:", wall_guids)
+    print(len(wall_guids))
+
+    dic_walls = {}
+    dic_wall_prisms = {}
+    topo_walls = []
+
+    # Wall layers of earlier runs on the same file, shared with find_adjacent_walls and 005A
+    cache_params = {} if args.geometry == "profiles" else {"geometry": args.geometry}
+    if args.snap_grid:
+        cache_params["snap_grid"] = args.snap_grid
+    geometry_cache = GeometryCache(ifc_file_path, "walls", cache_params, cache_dir)
+
+    # Welding once per storey, the grid is given in meters and the walls are in project units.
+    # Cached walls were welded in an earlier run, new walls snap onto their vertices.
+    welder = VertexWelder(args.snap_grid * project_unit_scale(ifc_file)) if args.snap_grid else None
+    # Layer contact tolerance is given in meters as well
+    layer_tolerance = args.layer_tolerance * project_unit_scale(ifc_file)
+    # Tolerance of the analytic extrusion contact, meters like for the rooms
+    contact_tolerance = DEFAULT_TOLERANCE * project_unit_scale(ifc_file)
+
+    walls = {}
+    for wall_guid in wall_guids:
+        cached = geometry_cache.get(wall_guid)
+        # Entries written by find_adjacent_walls / 005A have no prisms, those walls are reconstructed again
+        if cached is not None and "prisms" in cached:
+            if welder is not None:
+                welder.seed(entry_points(cached))
+            walls[wall_guid] = ([topology_from_entry(layer) for layer in cached["layers"]], cached["prisms"])
+
+    # All other walls of the storey are transformed together
+    missing = [wall_guid for wall_guid in wall_guids if wall_guid not in walls]
+    if args.geometry == "iterator":
+        reconstructed = tessellate_walls(ifc_file, missing, welder)
+    else:
+        reconstructed = reconstruct_walls(ifc_file, missing, placements, welder)
+    if welder is not None:
+        welder.report()
+    for wall_guid, (cells, prisms) in reconstructed.items():
+        geometry_cache.put(wall_guid, {"layers": [topology_to_entry(cell) for cell in cells], "prisms": prisms})
+    walls.update(reconstructed)
+
+    for wall_guid in wall_guids:
+        print("IFC GUID of Wall:", wall_guid)
+        cells, prisms = walls[wall_guid]
+        if cells != []:
+            # Create dictionary with walls
+            dic_walls[wall_guid] = cells
+            dic_wall_prisms[wall_guid] = prisms
+
+            # Create cell complex, add to cluster
+            complex = CellComplex.ByCells(cells)
+            guiddic = Dictionary.ByKeyValue("guid",wall_guid)
+            Topology.AddDictionary(complex,guiddic)
+            topo_walls.append(complex)
+
+    geometry_cache.save()
+    geometry_cache.report()
+
+    topologies_in_storey = [element for element in topo_walls if element is not None]
+
+    index_to_guid = {i: get_ifc_guid(topo) for i, topo in enumerate(topologies_in_storey)}
+
+    keys = [index_to_guid[i] for i in range(len(topologies_in_storey))]
+
+    if args.tile_size is not None and args.engine == "extrusion":
+        print("Tiles are used with the merge and layers engines, the extrusion engine checks all pairs")
+        args.tile_size = None
+
+    # Tiled runs never build the full pair list, the tiles plan their own pairs
+    if args.tile_size is None:
+        pairs = [(i, j) for i in range(len(topologies_in_storey)) for j in range(i + 1, len(topologies_in_storey))]
+
+    # Incremental run: compare the walls against the manifest of the last run
+    output_file = 'Output06_Wall_Adjacancy.csv'
+    dirty = None
+    if args.incremental:
+        manifest = build_manifest([ifc_file.by_guid(wall_guid) for wall_guid in wall_guids])
+        # One manifest per IFC file and storey, like 004
+        manifest_step = storey_step("003_walls", ifc_file_path, storey_name)
+        previous_manifest = load_manifest(manifest_step)
+        if previous_manifest is not None and output_unchanged(manifest_step, output_file):
+            changes = diff_manifests(previous_manifest, manifest)
+            print_changes(changes)
+            dirty = changes["added"] | changes["geometry"]
+            if args.tile_size is None:
+                pairs = dirty_pairs(pairs, keys, dirty)
+                print(f"Pairs with new or moved walls: {len(pairs)}")
+        else:
+            print("No manifest of an earlier run on this storey and Output06, checking all walls")
+
+    touching_walls_dict = {index_to_guid[i]: [] for i in range(len(topologies_in_storey))}
+
+    if args.engine == "layers" and args.tile_size is None:
+        # Boxes per layer, computed once per wall instead of once per pair
+        dic_layer_boxes = {guid: layer_bounding_boxes(dic_walls[guid]) for guid in keys}
+        # Workers get the layers as cluster in layer set order, the complex does not keep it
+        layer_topologies = [Cluster.ByTopologies(dic_walls[guid]) for guid in keys]
+        layer_check = partial(find_touching_walls_by_layers, tolerance=layer_tolerance)
+        layer_stats = {"merges_run": 0, "merges_skipped": 0}
+
+    if args.tile_size is not None:
+        # Tiled run: all tiles first, the rows are written once every pair is known
+        signature = run_signature(keys, args.engine, sorted(dirty) if dirty is not None else None, args.tile_size, args.halo, layer_tolerance)
+        for i, j in tiled_wall_pairs(args, keys, dic_walls, dirty, signature, layer_tolerance):
+            touching_walls_dict[index_to_guid[i]].append(index_to_guid[j])
+            touching_walls_dict[index_to_guid[j]].append(index_to_guid[i])
+        remove_checkpoint("003_walls")
+    else:
+        # Checkpoint: position in the pair list and the touching pairs found so far
+        signature = run_signature(keys, pairs, args.engine, dirty is not None)
+
+        # Merges with a time budget: the watchdog workers live for the whole pair loop
+        watchdog = None
+        if args.pair_budget and args.engine != "extrusion" and pairs:
+            if args.engine == "layers":
+                watchdog = PairWatchdog(layer_topologies, layer_check, args.workers, args.pair_budget)
+            else:
+                watchdog = PairWatchdog(topologies_in_storey, find_touching_walls, args.workers, args.pair_budget)
+            if args.validate:
+                # Validation would run the same merges without a budget
+                print("--validate is skipped for the wall pairs checked with --pair-budget")
+        # Pairs over budget that the extrusion test could not decide, recorded as not touching
+        undecided_pairs = []
+        # Without a budget the walls go to the worker processes once, every block is checked by the same pool
+        pool = None
+        if watchdog is None and args.engine != "extrusion" and args.workers > 1 and pairs:
+            if args.engine == "layers":
+                pool = PairPool(layer_topologies, layer_check, args.workers)
+            else:
+                pool = PairPool(topologies_in_storey, find_touching_walls, args.workers)
+
+        def check_block(block_start, block):
+            # Results of the pairs of a block in pair order, for the engine of the run
+            results = None
+            if watchdog is not None:
+                print(f"Checking wall pairs {block_start} - {block_start + len(block)} / {len(pairs)} with a budget of {args.pair_budget} s per pair")
+                results, failed = watchdog.run(block)
+                for offset in failed:
+                    guid1, guid2 = index_to_guid[block[offset][0]], index_to_guid[block[offset][1]]
+                    touching = fallback_contact(dic_wall_prisms[guid1], dic_wall_prisms[guid2], contact_tolerance)
+                    if touching is None:
+                        print(f"Merge of {guid1} - {guid2} over budget or failed and not decided by the extrusion test, recorded as not touching")
+                        logging.warning(f"Undecided wall pair over budget, recorded as not touching: {guid1} - {guid2}")
+                        undecided_pairs.append((guid1, guid2))
+                        touching = False
+                    else:
+                        print(f"Merge of {guid1} - {guid2} over budget or failed, decided by the extrusion test: {touching}")
+                        logging.debug(f"Pair over budget: {guid1} - {guid2}, extrusion contact: {touching}")
+                    results[offset] = (touching, 0, 0) if args.engine == "layers" else touching
+            elif pool is not None:
+                # Pairs are split across processes, results come back in pair order
+                print(f"Checking wall pairs {block_start} - {block_start + len(block)} / {len(pairs)} with {args.workers} workers")
+                results = pool.run(block)
+
+            for offset, (i, j) in enumerate(block):
+                guid1 = index_to_guid[i]
+                guid2 = index_to_guid[j]
+                if args.engine == "layers":
+                    if results is not None:
+                        touching, merges, skipped = results[offset]
+                    else:
+                        touching, merges, skipped = touching_layers(
+                            dic_walls[guid1], dic_walls[guid2],
+                            dic_layer_boxes[guid1], dic_layer_boxes[guid2],
+                            layer_tolerance
+                        )
+                    layer_stats["merges_run"] += merges
+                    layer_stats["merges_skipped"] += skipped
+                    logging.debug(f"Layers {guid1} - {guid2}: {merges} merges, {skipped} skipped, touching: {touching}")
+                    if args.validate and watchdog is None and touching != find_touching_walls(topologies_in_storey[i], topologies_in_storey[j]):
+                        print(f"Layer contact differs from Topology.Merge: {guid1} - {guid2}")
+                elif results is not None:
+                    touching = results[offset]
+                elif args.engine == "extrusion":
+                    # Analytic test per layer pair, Topology.Merge only for IfcPolygonalFaceSet layers
+                    touching = layered_prisms_share_face(
+                        dic_wall_prisms[guid1], dic_wall_prisms[guid2],
+                        dic_walls[guid1], dic_walls[guid2],
+                        layer_cells_share_face, contact_tolerance
+                    )
+                    if args.validate and touching != find_touching_walls(topologies_in_storey[i], topologies_in_storey[j]):
+                        print(f"Extrusion contact differs from Topology.Merge: {guid1} - {guid2}")
+                else:
+                    touching = find_touching_walls(topologies_in_storey[i], topologies_in_storey[j])
+                yield touching
+
+        # Full run: the rows of Output06 are written while the loop runs, one per wall
+        try:
+            touching = checkpointed_pairs("003_walls", signature, keys, pairs, check_block, args.checkpoint_every, args.resume, output_file if dirty is None else None, empty_rows=True)
+        finally:
+            if watchdog is not None:
+                watchdog.close()
+            if pool is not None:
+                pool.close()
+        for index, partners in touching.items():
+            touching_walls_dict[keys[index]] = [keys[j] for j in sorted(partners)]
+
+        if undecided_pairs:
+            # Contacts that may be missing from Output06, to be checked by hand or rerun without --pair-budget
+            print(f"{len(undecided_pairs)} wall pairs over the time budget could not be decided and are recorded as not touching:")
+            for guid1, guid2 in undecided_pairs:
+                print(f"  {guid1} - {guid2}")
+
+    if args.engine == "layers" and args.tile_size is None:
+        print(f"Layer merges run: {layer_stats['merges_run']}, merges skipped: {layer_stats['merges_skipped']}")
+
+    if args.tile_size is not None or dirty is not None:
+        if dirty is not None:
+            # Unchanged wall pairs keep their entries from the last Output06
+            touching_walls_dict = patch_adjacency(read_adjacency_csv(output_file), keys, touching_walls_dict, dirty)
+        with StreamingCSVWriter(output_file) as writer:
+            for key in keys:
+                writer.writerow([key, ",".join(touching_walls_dict.get(key, []))])
+
+    print(f'Results written to {output_file}')
+    write_edge_parquet(output_file, storey_name, building_name(ifc_file, storey_name))
+
+    if args.incremental:
+        save_manifest(manifest_step, manifest)
+        save_output_digest(manifest_step, output_file)